@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedFile',
+            fields=[
+                ('filename', models.CharField(max_length=255, primary_key=True, serialize=False, unique=True)),
+                ('size', models.BigIntegerField(null=True)),
+                ('modified', models.CharField(max_length=14, null=True)),
+                ('checksum', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Feed File',
+                'verbose_name_plural': 'Feed Files',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddField(
+            model_name='variations',
+            name='catalog_hash',
+            field=models.CharField(editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='variations',
+            name='inventory_hash',
+            field=models.CharField(editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='variations',
+            name='pricing_hash',
+            field=models.CharField(editable=False, max_length=20, null=True),
+        ),
+    ]
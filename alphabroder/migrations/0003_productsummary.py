@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Summaries of the products already loaded, later syncs keep them current
+FILL_SUMMARIES_SQL = """
+    WITH prices AS (
+        SELECT product_number_id, min(retail_price) AS min_price,
+               max(retail_price) AS max_price, sum(quantity) AS quantity,
+               count(*) AS variation_count,
+               (array_agg(front_image ORDER BY created_at DESC, item_number))[1] AS front_image
+        FROM alphabroder_variations
+        GROUP BY product_number_id
+    ), colors AS (
+        SELECT product_number_id, jsonb_agg(color_name ORDER BY first_item) AS colors
+        FROM (SELECT product_number_id, color_name, min(item_number) AS first_item
+              FROM alphabroder_variations
+              GROUP BY product_number_id, color_name) c
+        GROUP BY product_number_id
+    ), sizes AS (
+        SELECT product_number_id, jsonb_agg(size ORDER BY first_item) AS sizes
+        FROM (SELECT product_number_id, size, min(item_number) AS first_item
+              FROM alphabroder_variations
+              GROUP BY product_number_id, size) s
+        GROUP BY product_number_id
+    )
+    INSERT INTO alphabroder_productsummary (product_id, min_price, max_price, quantity,
+                                      variation_count, front_image, colors, sizes,
+                                      updated_at)
+    SELECT product_number_id, min_price, max_price, quantity, variation_count,
+           front_image, colors, sizes, now()
+    FROM prices JOIN colors USING (product_number_id) JOIN sizes USING (product_number_id)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0002_feedfile_variations_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='alphabroder.products')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('quantity', models.BigIntegerField(null=True)),
+                ('variation_count', models.IntegerField(default=0)),
+                ('front_image', models.CharField(max_length=255, null=True)),
+                ('colors', models.JSONField(default=list)),
+                ('sizes', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Product Summary',
+                'verbose_name_plural': 'Product Summaries',
+            },
+        ),
+        migrations.RunSQL(FILL_SUMMARIES_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
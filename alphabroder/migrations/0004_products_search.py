@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:01
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Search vectors of the products already loaded, later syncs keep them current
+FILL_SEARCH_VECTORS_SQL = """
+    UPDATE alphabroder_products p
+    SET search_vector =
+        setweight(to_tsvector('english', p.product_number), 'A') ||
+        setweight(to_tsvector('english', p.brand_name || ' ' || p.short_description), 'B') ||
+        setweight(to_tsvector('english', coalesce(c.colors, '')), 'C') ||
+        setweight(to_tsvector('english', p.full_feature_description), 'D')
+    FROM alphabroder_products q
+    LEFT JOIN (SELECT product_number_id, string_agg(DISTINCT color_name, ' ') AS colors
+               FROM alphabroder_variations
+               GROUP BY product_number_id) c ON c.product_number_id = q.product_id
+    WHERE p.product_id = q.product_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0003_productsummary'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='products',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='alpb_products_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('product_number'), name='gin_trgm_ops'), name='alpb_products_number_trgm'),
+        ),
+        migrations.RunSQL(FILL_SEARCH_VECTORS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
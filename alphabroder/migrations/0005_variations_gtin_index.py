@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0004_products_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='variations',
+            name='gtin',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
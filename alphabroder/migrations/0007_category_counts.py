@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:09
+
+from django.db import migrations, models
+
+# Counts of the categories already loaded, later syncs keep them current
+FILL_CATEGORIES_SQL = """
+    UPDATE alphabroder_category c
+    SET product_count = s.product_count, variation_count = s.variation_count,
+        min_price = s.min_price, max_price = s.max_price
+    FROM (
+        SELECT p.category_id, count(*) AS product_count,
+               coalesce(sum(ps.variation_count), 0) AS variation_count,
+               min(ps.min_price) AS min_price, max(ps.max_price) AS max_price
+        FROM alphabroder_products p
+        LEFT JOIN alphabroder_productsummary ps ON ps.product_id = p.product_id
+        GROUP BY p.category_id
+    ) s
+    WHERE c.category = s.category_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0006_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='products',
+            name='alpb_products_category_upper',
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='variation_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(FILL_CATEGORIES_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:15
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0007_category_counts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='variations',
+            name='catalog_hash',
+        ),
+        migrations.RemoveField(
+            model_name='variations',
+            name='inventory_hash',
+        ),
+        migrations.RemoveField(
+            model_name='variations',
+            name='pricing_hash',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alphabroder', '0008_remove_variation_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variations',
+            name='warehouse_quantities',
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.translation import gettext_lazy as _
 
 class Category(models.Model):
@@ -6,6 +9,12 @@ class Category(models.Model):
     category = models.CharField(max_length=255, unique=True, primary_key=True)
     category_image = models.CharField(max_length=255)
 
+    # Counts and price range of the products, kept by the sync
+    product_count = models.IntegerField(default=0)
+    variation_count = models.IntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
     # product create and update fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -14,6 +23,10 @@ class Category(models.Model):
         ordering = ("-created_at",)
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
+        indexes = [
+            models.Index(Upper('category'), name='alpb_category_upper_idx'),
+            models.Index(fields=['created_at'], name='alpb_category_created_idx'),
+        ]
 
     def __str__(self):
         return self.category
@@ -34,6 +47,9 @@ class Products(models.Model):
     )
     full_feature_description = models.TextField()
 
+    # Style number, brand, descriptions and colors, refreshed by the sync
+    search_vector = SearchVectorField(null=True, editable=False)
+
     # product create and update fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -42,6 +58,13 @@ class Products(models.Model):
         ordering = ("-created_at",)
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        indexes = [
+            models.Index(fields=['created_at', 'product_id'], name='alpb_products_created_idx'),
+            GinIndex(fields=['search_vector'], name='alpb_products_search_idx'),
+            # Partial style numbers, matched with icontains
+            GinIndex(OpClass(Upper('product_number'), name='gin_trgm_ops'),
+                     name='alpb_products_number_trgm'),
+        ]
 
     def __str__(self):
         return f"{self.product_number} - {self.short_description}"
@@ -64,10 +87,12 @@ class Variations(models.Model):
     front_image = models.CharField(max_length=255)
     back_image = models.CharField(max_length=255)
     side_image = models.CharField(max_length=255)
-    gtin = models.CharField(max_length=255)
+    gtin = models.CharField(max_length=255, db_index=True)
 
     # inventory Field
     quantity = models.IntegerField(null=True)
+    # Stock in each warehouse, by code, that `quantity` totals
+    warehouse_quantities = models.JSONField(null=True)
 
     # Price Field
     price_per_piece = models.DecimalField(max_digits=10, decimal_places=2, null=True)
@@ -83,6 +108,57 @@ class Variations(models.Model):
         ordering = ("-created_at",)
         verbose_name = _("Variation")
         verbose_name_plural = _("Variations")
+        indexes = [
+            models.Index(fields=['product_number', 'retail_price'], name='alpb_variations_price_idx'),
+            models.Index(fields=['product_number', 'created_at'], name='alpb_variations_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.item_number
+
+
+class ProductSummary(models.Model):
+    # Listing details of a product, refreshed by the sync after each load
+    product = models.OneToOneField(
+        Products,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary',
+    )
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    quantity = models.BigIntegerField(null=True)
+    variation_count = models.IntegerField(default=0)
+    front_image = models.CharField(max_length=255, null=True)
+    colors = models.JSONField(default=list)
+    sizes = models.JSONField(default=list)
+
+    # summary update field
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Product Summary")
+        verbose_name_plural = _("Product Summaries")
+
+    def __str__(self):
+        return str(self.product_id)
+
+
+class FeedFile(models.Model):
+    # Fingerprint of a vendor file as of the last sync that processed it
+    filename = models.CharField(max_length=255, unique=True, primary_key=True)
+    size = models.BigIntegerField(null=True)
+    modified = models.CharField(max_length=14, null=True)
+    checksum = models.CharField(max_length=64)
+
+    # file create and update fields
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        verbose_name = _("Feed File")
+        verbose_name_plural = _("Feed Files")
 
     def __str__(self):
-        return self.item_number
\ No newline at end of file
+        return self.filename
\ No newline at end of file
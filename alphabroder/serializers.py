@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from django.db.models import Min, Max
 
 from .models import Category, Products, Variations
 
@@ -7,34 +6,30 @@ class ProductCategoryReadSerializer(serializers.ModelSerializer):
     """
     Serializer class for product categories
     """
+    price_range = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['category', 'category_image']
+        fields = ['category', 'category_image', 'product_count', 'variation_count', 'price_range']
+
+    def get_price_range(self, obj):
+        # Minimum and maximum retail prices of the category's products
+        return {'min_price': obj.min_price, 'max_price': obj.max_price}
 
 
 class ProductReadSerializer(serializers.ModelSerializer):
-    front_image = serializers.SerializerMethodField()
+    # Annotated on the queryset by the list view
+    front_image = serializers.CharField(read_only=True)
     price_range = serializers.SerializerMethodField()
 
     class Meta:
         model = Products
         fields = ['product_number', 'short_description', 
                   'category', 'full_feature_description', 'front_image', 'price_range']
-
-    def get_front_image(self, obj):
-        # Get the first product related to the product
-        product = Variations.objects.filter(product_number=obj).first()
-        if product:
-            return product.front_image
-        return None
     
     def get_price_range(self, obj):
-        # Get the minimum and maximum retail prices from related variations
-        min_price = obj.variations.aggregate(min_price=Min('retail_price'))['min_price']
-        max_price = obj.variations.aggregate(max_price=Max('retail_price'))['max_price']
-
-        return {'min_price': min_price, 'max_price': max_price}
+        # Minimum and maximum retail prices of the related variations
+        return {'min_price': obj.min_price, 'max_price': obj.max_price}
     
 class VariationsSerializer(serializers.ModelSerializer):
     class Meta:
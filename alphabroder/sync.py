@@ -1,24 +1,131 @@
 import os
-from datetime import datetime
-from ftplib import FTP_TLS
 import ssl
-import shutil
-from decimal import Decimal
-import logging
 
 from django.conf import settings
-from django.http import HttpResponse
-from django.http import HttpResponseServerError
-
-import pandas as pd
+from django.db import connection, transaction
 
+from api.ftp import VendorFTPClient
+from catalog.ingest import VendorSync, clean_gtin, clean_integer, clean_numeric
 
 # import product models
-from .models import Category, Products, Variations
-
-
-class Process_alp_inventory():
+from .models import Category, FeedFile, Products, ProductSummary, Variations
+
+
+#####################################################
+#                   Merge Statements                #
+#####################################################
+IMAGE_URL = 'https://www.alphabroder.com/media/hires/'
+
+# Product file columns that map to non-nullable fields
+PRODUCT_REQUIRED_COLUMNS = [
+    'Item Number', 'Style', 'Category', 'Short Description', 'Mill Name',
+    'Full Feature Description', 'Color Name', 'Hex Code', 'Size', 'Case Qty',
+    'Weight', 'Front Image Hi Res URL', 'Back Image Hi Res URL',
+    'Side Image Hi Res URL', 'Gtin',
+]
+
+# Rows missing a required value can't be saved, they are dropped up front
+DELETE_INCOMPLETE_PRODUCTS_SQL = """
+    DELETE FROM {{stage}}
+    WHERE NOT ({})
+""".format(' AND '.join(f'"{column}" IS NOT NULL' for column in PRODUCT_REQUIRED_COLUMNS))
+
+# Existing variations are never touched when they are skipped
+DELETE_EXISTING_PRODUCTS_SQL = """
+    DELETE FROM {stage} s
+    USING {variations} v
+    WHERE v.item_number = s."Item Number"
+"""
+
+MERGE_CATEGORIES_SQL = f"""
+    INSERT INTO {{categories}} (category, category_image, product_count,
+                                variation_count, created_at, updated_at)
+    SELECT DISTINCT "Category", '', 0, 0, now(), now()
+    FROM {{stage}}
+    WHERE {clean_integer('"Case Qty"')} IS NOT NULL
+    ON CONFLICT (category) DO NOTHING
+"""
+
+# A style keeps the details of the first row it appears on
+MERGE_PRODUCTS_SQL = f"""
+    INSERT INTO {{products}} (product_number, brand_name, short_description,
+                              category_id, full_feature_description,
+                              created_at, updated_at)
+    SELECT DISTINCT ON ("Style")
+           "Style", "Mill Name", "Short Description", "Category",
+           "Full Feature Description", now(), now()
+    FROM {{stage}}
+    WHERE {clean_integer('"Case Qty"')} IS NOT NULL
+    ORDER BY "Style", _line
+    ON CONFLICT (product_number) {{on_conflict}}
+"""
+
+MERGE_VARIATIONS_SQL = f"""
+    INSERT INTO {{variations}} (item_number, product_number_id, color_name,
+                                color_code, hex_code, size_code, size,
+                                case_qty, weight, front_image, back_image,
+                                side_image, gtin, created_at, updated_at)
+    SELECT s."Item Number", p.product_id, s."Color Name", s."Color Code",
+           s."Hex Code", s."Size Code", s."Size", {clean_integer('s."Case Qty"')},
+           s."Weight",
+           replace(s."Front Image Hi Res URL", '{IMAGE_URL}', ''),
+           replace(s."Back Image Hi Res URL", '{IMAGE_URL}', ''),
+           replace(s."Side Image Hi Res URL", '{IMAGE_URL}', ''),
+           {clean_gtin('s."Gtin"')}, now(), now()
+    FROM {{stage}} s
+    JOIN {{products}} p ON p.product_number = s."Style"
+    WHERE {clean_integer('s."Case Qty"')} IS NOT NULL
+    ON CONFLICT (item_number) {{on_conflict}}
+"""
+
+# Stock is saved per warehouse and totalled, `warehouse_quantities` is
+# the jsonb_build_object of each warehouse's stock and `quantity` their sum
+UPDATE_INVENTORY_SQL = f"""
+    UPDATE {{variations}} v
+    SET quantity = s.quantity, warehouse_quantities = s.warehouse_quantities,
+        updated_at = now()
+    FROM (
+        SELECT "Item Number" AS item_number,
+               {clean_gtin('"GTIN Number"')} AS gtin,
+               {{quantity}} AS quantity,
+               {{warehouse_quantities}} AS warehouse_quantities
+        FROM {{stage}}
+    ) s
+    WHERE v.item_number = s.item_number
+      AND v.gtin = s.gtin
+      AND (v.quantity, v.warehouse_quantities)
+          IS DISTINCT FROM (s.quantity, s.warehouse_quantities)
+"""
+
+UPDATE_PRICING_SQL = f"""
+    UPDATE {{variations}} v
+    SET price_per_piece = s.price_per_piece,
+        price_per_dozen = s.price_per_dozen,
+        price_per_case = s.price_per_case,
+        retail_price = s.retail_price,
+        updated_at = now()
+    FROM (
+        SELECT "Item Number " AS item_number,
+               {clean_gtin('"Gtin"')} AS gtin,
+               {clean_numeric('"Piece"')} AS price_per_piece,
+               {clean_numeric('"Dozen"')} AS price_per_dozen,
+               {clean_numeric('"Case"')} AS price_per_case,
+               {clean_numeric('"Retail"')} AS retail_price
+        FROM {{stage}}
+    ) s
+    WHERE v.item_number = s.item_number
+      AND v.gtin = s.gtin
+      AND (v.price_per_piece, v.price_per_dozen, v.price_per_case, v.retail_price)
+          IS DISTINCT FROM
+          (s.price_per_piece, s.price_per_dozen, s.price_per_case, s.retail_price)
+"""
+
+
+class Process_alp_inventory(VendorSync):
+    """Alphabroder adapter: the catalog, inventory and pricing come in
+      three files, each staged and merged on its own."""
     _skip_existing = True
+    vendor = 'alpb'
 
     # AB connection info
     ftp_host = 'ftp.appareldownload.com'
@@ -29,265 +136,125 @@ class Process_alp_inventory():
     product_file = 'AllDBInfoALP_Prod.txt'
     inventory_file = 'inventory-v5-alp.txt'
     price_file = 'AllDBInfoALP_PRC_RZ99.txt'
-
-    # image url
-    image_url = 'https://www.alphabroder.com/media/hires/'
-
-    def __init__(self, download=True, debug=True, suffix=None,
-                 basename=None, detail=None):
-        """Initialize inventory by parsing provided inventory
-          CSV file and building a dict of all inventory items."""
-        self._db = None
-        self._download = download
-        self._debug = debug
-        self._suffix = suffix
-        self._basename = basename
-        self._detail = detail
-        self._current_products = {}
-        self._product_images = {}
-        self.logger = logging.getLogger(__name__)
-
-    #####################################################
-    #                       Commons                     #
-    #####################################################
-        
-    def ensure_directory(self, directory):
-        """Ensure that the given directory exists."""
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-
-    def download_file(self, ftp, filename, dir=''):
-        """Download given file from global FTP server."""
-        download_to = os.path.join('files', 'alpb', filename)
-        self.debug("Downloading '{}' to: {}".format(filename, download_to))
-
-        local_file = open(download_to, 'wb')
-        ftp.retrbinary(f'RETR {dir}{filename}', local_file.write)
-        local_file.close()
-
-    def download_alpha(self, filename):
-        """Download the given file."""
-        host = self.ftp_host
-        user = self.ftp_user
-        passwd = self.ftp_password
-
+    feed_files = {
+        product_file: 'update_products',
+        inventory_file: 'update_inventory',
+        price_file: 'update_pricing',
+    }
+
+    # Models
+    category_model = Category
+    product_model = Products
+    variation_model = Variations
+    summary_model = ProductSummary
+    feed_model = FeedFile
+
+    # Columns read from each file, everything else is skipped while parsing
+    product_columns = PRODUCT_REQUIRED_COLUMNS + ['Color Code', 'Size Code']
+    warehouses = ['CC', 'CN', 'FO', 'GD', 'KC', 'MA', 'PH', 'TD', 'PZ', 'BZ',
+                  'FZ', 'PX', 'FX', 'BX', 'GX']
+    inventory_columns = ['Item Number', 'GTIN Number'] + warehouses
+    price_columns = ['Item Number ', 'Gtin', 'Piece', 'Dozen', 'Case', 'Retail']
+
+    def ftp_client(self):
+        """Return a client for the Alphabroder FTP server."""
         ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
         ssl_context.set_ciphers("DEFAULT")
-
-        ftp = FTP_TLS(host=host, context=ssl_context, timeout=10)
-        ftp.set_debuglevel(2)
-        ftp.set_pasv(True)
-
-        ftp.login(user=user, passwd=passwd)
-        ftp.prot_p()  # Explicit FTP over TLS
-
-        self.ensure_directory('files/alpb')  # Ensure 'files' directory exists
-        self.download_file(ftp, filename)
-
-        ftp.quit()
-        
-    def clean_directory(self, directory):
-        """Clean the given directory by removing all files."""
-        self.debug(f"Cleaning directory: {directory}")
-        try:
-            shutil.rmtree(directory)
-            os.makedirs(directory)
-            self.debug(f"Directory cleaned successfully.")
-        except Exception as e:
-            self.debug(f"Error cleaning directory: {e}")
-    
-    def debug(self, msg, force=False):
-        """Method for printing debug messages."""
-        if self._debug or force:
-            print("<{}>: {}".
-                  format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), msg))
-
-            
-    #####################################################
-    #     Download Inventory, products, Price file      #
-    #####################################################
-        
-    def prepare_products(self):
-        """Prepare for updating products by downloading relevant files."""
-        self.download_alpha(self.product_file)
-
-    def prepare_inventory(self):
-        """Prepare for updating product inventory by downloading relevant
-          files."""
-        self.download_alpha(self.inventory_file)
-
-    def prepare_pricing(self):
-        """Prepare for updating product pricing by downloading relevant
-          files."""
-        self.download_alpha(self.price_file)
+        return VendorFTPClient(self.ftp_host, self.ftp_user, self.ftp_password,
+                               tls=True, ssl_context=ssl_context)
 
     #####################################################
     #                   Update Products                 #
     #####################################################
-    def update_products(self, filename):
-        """Read product details from the text file and
-          save them to the model."""
-        file_path = os.path.join('files', 'alpb', filename)
-
-        if not os.path.isfile(file_path):
-            self.debug(f"File {filename} not found.")
-            return
-
-        self.debug(f"Updating products from file: {filename}")
-
-        # Read the file using pandas
-        df = pd.read_csv(file_path, sep='^', encoding='ISO-8859-1', error_bad_lines=False)
-
-        # Iterate over rows and save to the model
-        for _, row in df.iterrows():
-            try:
-                category, created = Category.objects.get_or_create(category=row['Category'])
-
-                # Create or get Style
-                product, created = Products.objects.get_or_create(
-                    product_number=row['Style'],
-                    defaults={
-                        'short_description': row['Short Description'],
-                        'brand_name': row['Mill Name'],
-                        'category': category,
-                        'full_feature_description': row['Full Feature Description'],
-                    }
+    def update_products(self, feed):
+        """Stage the product file and merge new categories, products
+          and variations into the model."""
+        self.logger.info("Updating products from file: %s", os.path.basename(feed.name))
+        self.report(phase='update products')
+
+        stage = 'alpb_products_stage'
+        with transaction.atomic():
+            _, staged = self.load_stage(feed, stage, self.product_columns, delimiter='^')
+            with self.phase('transform'):
+                incomplete = self.execute_stage_sql(DELETE_INCOMPLETE_PRODUCTS_SQL, stage)
+                self.deduplicate_stage(stage, 'Item Number',
+                                       keep='first' if self._skip_existing else 'last')
+                if self._skip_existing:
+                    self.execute_stage_sql(DELETE_EXISTING_PRODUCTS_SQL, stage)
+            if incomplete:
+                self.count(errored=incomplete)
+                self.report(error=f"Skipped {incomplete} rows with missing required values.")
+
+            with self.phase('write'):
+                categories = self.execute_stage_sql(MERGE_CATEGORIES_SQL, stage)
+                products = self.execute_stage_sql(
+                    MERGE_PRODUCTS_SQL, stage,
+                    on_conflict=self.conflict_action('products', [
+                        'short_description', 'brand_name', 'category_id',
+                        'full_feature_description',
+                    ]),
+                )
+                created, updated = self.execute_merge_sql(
+                    MERGE_VARIATIONS_SQL, stage,
+                    on_conflict=self.conflict_action('variations', [
+                        'product_number_id', 'color_name', 'color_code', 'hex_code',
+                        'size_code', 'size', 'case_qty', 'weight', 'front_image',
+                        'back_image', 'side_image', 'gtin',
+                    ]),
                 )
 
-                # Create Product
-                variation_details = {
-                    'item_number': row['Item Number'],
-                    'product_number': product,
-                    'color_name': row['Color Name'],
-                    'color_code': row['Color Code'],
-                    'hex_code': row['Hex Code'],
-                    'size_code': row['Size Code'],
-                    'size': row['Size'],
-                    'case_qty': row['Case Qty'],
-                    'weight': row['Weight'],
-                    'front_image': row['Front Image Hi Res URL'].replace(self.image_url, ''),
-                    'back_image': row['Back Image Hi Res URL'].replace(self.image_url, ''),
-                    'side_image': row['Side Image Hi Res URL'].replace(self.image_url, ''),
-                    'gtin': row['Gtin'],
-                }
-                # Use get_or_create for Products
-                variation, created = Variations.objects.get_or_create(item_number=row['Item Number'], defaults=variation_details)
-
-                if not created and not self._skip_existing:
-                    Variations.objects.filter(item_number=row['Item Number']).update(**variation_details)
-                    self.debug(f"Updated existing product with Item Number: {row['Item Number']}")
-                elif not created:
-                    self.debug(f"Skipped existing product with Item Number: {row['Item Number']}")
-                else:
-                    self.debug(f"Created new product with Item Number: {row['Item Number']}")
-
-            except Exception as e:
-                self.debug(f"Error processing row: {row}")
-                self.debug(f"Error details: {e}")
+        # Duplicate, existing, unchanged and case-less rows are skipped
+        self.count(created=created, updated=updated,
+                   skipped=staged - incomplete - created - updated)
+        self.logger.info("Saved %d new and %d changed variations, %d products and %d categories.",
+                         created, updated, products, categories)
 
-                
     #####################################################
     #                  Update Inventory                 #
     #####################################################
-    def update_inventory(self, filename):
-        file_path = os.path.join('files', 'alpb', filename)
-
-        if not os.path.isfile(file_path):
-            self.debug(f"File {filename} not found.")
-            return
-
-        self.debug(f"Updating inventory from file: {filename}")
-
-        # Read the file using pandas
-        df = pd.read_csv(file_path, delimiter=',', encoding='ISO-8859-1', error_bad_lines=False)
-
-        for _, row in df.iterrows():
-            # check if the item number and gtin number are not empty. and same
-            item_number = row['Item Number']
-            gtin_number = row['GTIN Number']
-
-            # Check if the item number is in the product list
-            try:
-                variation = Variations.objects.get(item_number=item_number, gtin=gtin_number)
-            except Variations.DoesNotExist:
-                self.debug(f"Product not found for Item Number: {item_number} and GTIN Number: {gtin_number}")
-                continue  # Skip to the next iteration if the product doesn't exist
-
-            quantity_sum = sum(
-                int(row.get(field, 0)) for field in ['CC', 'CN', 'FO', 'GD', 'KC', 'MA', 'PH', 'TD', 'PZ', 'BZ', 'FZ', 'PX', 'FX', 'BX', 'GX']
-            )
-
-            variation.quantity = quantity_sum
-            variation.save()
-
-            self.debug(f"Updated inventory details for Item Number: {item_number} and GTIN Number: {gtin_number}")
+    def update_inventory(self, feed):
+        """Stage the inventory file and save the stock of each variation
+          in every warehouse, and its total."""
+        self.logger.info("Updating inventory from file: %s", os.path.basename(feed.name))
+        self.report(phase='update inventory')
+
+        stage = 'alpb_inventory_stage'
+        with transaction.atomic():
+            columns, staged = self.load_stage(feed, stage, self.inventory_columns, delimiter=',')
+            with self.phase('transform'):
+                self.deduplicate_stage(stage, 'Item Number', keep='last')
+
+            # Warehouses missing from the file count as empty
+            stock = {
+                warehouse: f'coalesce({clean_integer(connection.ops.quote_name(warehouse))}, 0)'
+                for warehouse in self.warehouses if warehouse in columns
+            }
+            quantity = ' + '.join(stock.values()) or '0'
+            warehouse_quantities = 'jsonb_build_object({})'.format(', '.join(
+                f"'{warehouse}', {expression}" for warehouse, expression in stock.items()
+            ))
+            with self.phase('write'):
+                updated = self.execute_stage_sql(UPDATE_INVENTORY_SQL, stage, quantity=quantity,
+                                                 warehouse_quantities=warehouse_quantities)
+
+        self.count(updated=updated, skipped=staged - updated)
+        self.logger.info("Updated inventory details for %d changed variations.", updated)
 
     #####################################################
     #                   Update Pricing                  #
     #####################################################
-    def update_pricing(self, filename):
-        file_path = os.path.join('files', 'alpb', filename)
-
-        if not os.path.isfile(file_path):
-            self.debug(f"File {filename} not found.")
-            return
-
-        self.debug(f"Updating Pricing from file: {filename}")
-
-        # Read the file using pandas
-        df = pd.read_csv(file_path, sep='^', encoding='ISO-8859-1', error_bad_lines=False)
-
-        # Iterate over rows and save to the model
-        for _, row in df.iterrows():
-            # check if the item number and gtin number are not empty. and same
-            item_number = row['Item Number ']
-            gtin_number = row['Gtin']
-
-            # Check if the item number is in the product list
-            try:
-                variation = Variations.objects.get(item_number=item_number, gtin=gtin_number)
-            except Variations.DoesNotExist:
-                self.debug(f"Product not found for Item Number: {item_number} and GTIN Number: {gtin_number}")
-                continue  # Skip to the next iteration if the product doesn't exist
-
-            def clean_numeric(value):
-                if pd.isna(value) or value == '“nan”':
-                    return None
-                numeric_value = ''.join(char for char in str(value) if char.isdigit() or char == '.')
-                # Convert the cleaned numeric value to a Decimal
-                return Decimal(numeric_value) if numeric_value else None
-
-            # Update the product details
-            variation.price_per_piece = clean_numeric(row['Piece'])
-            variation.price_per_dozen = clean_numeric(row['Dozen'])
-            variation.price_per_case = clean_numeric(row['Case'])
-            variation.retail_price = clean_numeric(row['Retail'])
-            variation.save()
-            self.debug(f"Updated Pricing details for Item Number: {item_number} and GTIN Number: {gtin_number}")
-                             
-                
-    #####################################################
-    #                   Update Handler                  #
-    #####################################################
-    def handle(self):
-        """Handle GET requests to start downloading, processing,
-          and updating the model."""
-        self.clean_directory(os.path.join('files', 'alpb'))
-        self.prepare_products()
-        self.update_products(self.product_file)
-        self.prepare_inventory()
-        self.update_inventory(self.inventory_file)
-        self.prepare_pricing()
-        self.update_pricing(self.price_file)
-        self.debug("Finished updating products and inventory and Pricing.")
-        return True
-
-class UpdateALPDB():
-    def start(self):
-        try:
-            process_alp_inventory = Process_alp_inventory()
-            resp = process_alp_inventory.handle()
-            return HttpResponse("Data updated successfully.")
-
-        except Exception as e:
-            return HttpResponseServerError(f"Error during update: {str(e)}")
\ No newline at end of file
+    def update_pricing(self, feed):
+        """Stage the price file and save the prices of each variation."""
+        self.logger.info("Updating pricing from file: %s", os.path.basename(feed.name))
+        self.report(phase='update pricing')
+
+        stage = 'alpb_pricing_stage'
+        with transaction.atomic():
+            _, staged = self.load_stage(feed, stage, self.price_columns, delimiter='^')
+            with self.phase('transform'):
+                self.deduplicate_stage(stage, 'Item Number ', keep='last')
+            with self.phase('write'):
+                updated = self.execute_stage_sql(UPDATE_PRICING_SQL, stage)
+
+        self.count(updated=updated, skipped=staged - updated)
+        self.logger.info("Updated pricing details for %d changed variations.", updated)
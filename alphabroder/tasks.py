@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from catalog.tasks import run_sync
+
+from .sync import Process_alp_inventory
+
+
+@shared_task(bind=True)
+def sync_alphabroder(self, force=False):
+    """Download the Alphabroder files and update the catalog, publishing
+      progress to the result backend. Files unchanged since the last
+      sync are skipped unless forced, and the job fails when another
+      one is syncing the vendor already."""
+    return run_sync(self, Process_alp_inventory, force)
@@ -1,3 +1,621 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import json
+import os
+from ftplib import FTP, error_perm
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from prometheus_client import REGISTRY
+
+from api.caching import bump_catalog_version, catalog_version
+from api.ftp import VendorFTPClient
+from catalog.models import SyncRun, VendorVariation
+from catalog.vendor_views import categories_cache
+from api.testing import (
+    CatalogTestCase, FeedSyncMixin, LocalFTPServerMixin, QueryCountMixin, QueryPlanMixin,
+)
+from .models import Category, FeedFile, ProductSummary, Variations
+from .sync import IMAGE_URL, Process_alp_inventory
+
+
+class AlphabroderTestCase(CatalogTestCase):
+    sync_class = Process_alp_inventory
+    variation_fields = {'side_image': 's.jpg'}
+
+
+class VendorFTPClientTests(LocalFTPServerMixin, SimpleTestCase):
+    files = {
+        'AllDBInfoALP_Prod.txt': b'product\n' * 5000,
+        'inventory-v5-alp.txt': b'inventory\n' * 3000,
+        'AllDBInfoALP_PRC_RZ99.txt': b'price\n' * 4000,
+    }
+
+    def setUp(self):
+        root, port = self.start_ftp_server(self.files)
+        self.client = VendorFTPClient('127.0.0.1', 'vendor', 'secret', port=port,
+                                      blocksize=1024)
+        self.addCleanup(self.client.close)
+        self.download_to = self.local_dir()
+
+    def test_sessions_are_reused(self):
+        self.client.stat('AllDBInfoALP_Prod.txt')
+        self.client.download('AllDBInfoALP_Prod.txt',
+                             os.path.join(self.download_to, 'products.txt'))
+        self.client.download('inventory-v5-alp.txt',
+                             os.path.join(self.download_to, 'inventory.txt'))
+
+        self.assertEqual(self.client.logins, 1)
+
+    def test_stat_reports_size_and_mdtm(self):
+        size, modified = self.client.stat('inventory-v5-alp.txt')
+
+        self.assertEqual(size, len(self.files['inventory-v5-alp.txt']))
+        self.assertRegex(modified, r'^\d{14}')
+
+    def test_interrupted_download_resumes_with_rest(self):
+        retrbinary = FTP.retrbinary
+        offsets = []
+
+        def flaky_retrbinary(ftp, cmd, callback, blocksize=8192, rest=None):
+            offsets.append(rest)
+            if len(offsets) > 1:
+                return retrbinary(ftp, cmd, callback, blocksize, rest)
+
+            # Drop the connection after the first few blocks
+            received = []
+
+            def interrupt(block):
+                callback(block)
+                received.append(block)
+                if len(received) == 3:
+                    raise EOFError
+            return retrbinary(ftp, cmd, interrupt, blocksize, rest)
+
+        local_path = os.path.join(self.download_to, 'products.txt')
+        with mock.patch.object(FTP, 'retrbinary', flaky_retrbinary):
+            transferred = self.client.download('AllDBInfoALP_Prod.txt', local_path)
+
+        with open(local_path, 'rb') as local_file:
+            self.assertEqual(local_file.read(), self.files['AllDBInfoALP_Prod.txt'])
+        self.assertEqual(offsets, [None, 3 * 1024])
+        self.assertEqual(transferred, len(self.files['AllDBInfoALP_Prod.txt']))
+        self.assertFalse(os.path.exists(local_path + '.part'))
+
+    def test_stream_saves_a_local_copy_while_reading(self):
+        local_path = os.path.join(self.download_to, 'products.txt')
+        content = self.files['AllDBInfoALP_Prod.txt']
+
+        with self.client.stream('AllDBInfoALP_Prod.txt', local_path, queue_size=2) as feed:
+            self.assertEqual(feed.read(), content)
+
+        self.assertTrue(feed.complete)
+        self.assertEqual(feed.size, len(content))
+        self.assertEqual(feed.checksum, hashlib.sha256(content).hexdigest())
+        with open(local_path, 'rb') as local_file:
+            self.assertEqual(local_file.read(), content)
+
+    def test_closing_a_stream_early_stops_the_download(self):
+        local_path = os.path.join(self.download_to, 'products.txt')
+
+        with self.client.stream('AllDBInfoALP_Prod.txt', local_path, queue_size=1) as feed:
+            feed.read(10)
+
+        self.assertFalse(feed._thread.is_alive())
+        self.assertFalse(feed.complete)
+        self.assertFalse(os.path.exists(local_path))
+
+    def test_stream_raises_download_errors_in_the_reader(self):
+        with self.assertRaises(error_perm):
+            with self.client.stream('missing.txt') as feed:
+                feed.read()
+
+    def test_permanent_errors_are_not_retried(self):
+        with self.assertRaises(error_perm):
+            self.client.download('missing.txt', os.path.join(self.download_to, 'missing.txt'))
+
+        self.assertEqual(self.client.logins, 1)
+
+
+class OpenFeedsTests(FeedSyncMixin, AlphabroderTestCase):
+    catalog_styles = 0
+    files = {
+        'AllDBInfoALP_Prod.txt': b'product\n',
+        'inventory-v5-alp.txt': b'inventory\n',
+        'AllDBInfoALP_PRC_RZ99.txt': b'price\n',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.appended = {}
+        self.serve_feeds(self.files)
+        self.process = Process_alp_inventory(debug=False)
+
+    def sync_files(self):
+        with self.process.ftp_client() as client:
+            feeds = self.process.open_feeds(client, list(self.files))
+            for filename, feed in feeds.items():
+                with feed:
+                    self.assertEqual(feed.read(), self.files[filename]
+                                     + self.appended.get(filename, b''))
+                self.process.record_fingerprint(filename, feed)
+        self.process.save_fingerprints()
+        return set(feeds)
+
+    def test_unchanged_files_are_skipped(self):
+        self.assertEqual(self.sync_files(), set(self.files))
+        self.assertEqual(FeedFile.objects.count(), 3)
+
+        self.assertEqual(self.sync_files(), set())
+
+    def test_changed_file_is_downloaded_again(self):
+        self.sync_files()
+        self.appended['inventory-v5-alp.txt'] = b'more inventory\n'
+        with open(os.path.join(self.root, 'inventory-v5-alp.txt'), 'ab') as remote_file:
+            remote_file.write(b'more inventory\n')
+
+        self.assertEqual(self.sync_files(), {'inventory-v5-alp.txt'})
+        with open(os.path.join('files', 'alpb', 'inventory-v5-alp.txt'), 'rb') as local_file:
+            self.assertEqual(local_file.read(), b'inventory\nmore inventory\n')
+
+    def test_reupload_with_same_content_is_skipped(self):
+        self.sync_files()
+        os.utime(os.path.join(self.root, 'inventory-v5-alp.txt'), (0, 0))
+
+        self.assertEqual(self.sync_files(), set())
+        self.assertEqual(FeedFile.objects.get(filename='inventory-v5-alp.txt').modified,
+                         '19700101000000')
+        self.assertEqual(self.sync_files(), set())
+
+    def test_reupload_with_new_content_of_same_size_is_loaded(self):
+        self.sync_files()
+        self.files = {**self.files, 'inventory-v5-alp.txt': b'INVENTORY\n'}
+        self.upload('inventory-v5-alp.txt', b'INVENTORY\n')
+
+        self.assertEqual(self.sync_files(), {'inventory-v5-alp.txt'})
+        self.assertEqual(self.sync_files(), set())
+
+
+class QueryPlanTests(QueryPlanMixin, QueryCountMixin, AlphabroderTestCase):
+    large_tables = ('alphabroder_products', 'alphabroder_variations')
+
+    def test_endpoints_use_indexes(self):
+        urls = [
+            reverse('alpbproducts:products-list'),
+            reverse('alpbproducts:products-list') + '?category=tees',
+            reverse('alpbproducts:products-list') + '?search=g1',
+            reverse('alpbproducts:products-list') + '?pagination=cursor',
+            reverse('alpbproducts:categories-list'),
+            reverse('alpbproducts:product-variations', args=['G1']),
+            reverse('alpbproducts:products-batch') + '?product_numbers=G0,G2',
+            reverse('alpbproducts:stock') + '?item_numbers=B0S,B1M&gtins=190000000020',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNoSeqScan(url)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.assertConstantQueries(reverse('alpbproducts:products-list'))
+        self.assertConstantQueries(reverse('alpbproducts:products-list') + '?pagination=cursor')
+        # Read once, categories are served from memory, read them every time
+        with mock.patch.object(categories_cache, 'ttl', 0):
+            self.assertConstantQueries(reverse('alpbproducts:categories-list'))
+        self.assertConstantQueries(reverse('alpbproducts:products-batch'), 'product_numbers',
+                                   values=['G0', 'G0,G1,G2'])
+
+
+@override_settings(MIDDLEWARE=['api.profiling.QueryProfilingMiddleware', *settings.MIDDLEWARE])
+class QueryProfilingMiddlewareTests(AlphabroderTestCase):
+    catalog_styles = 1
+
+    def test_server_timing_and_histograms(self):
+        labels = {'view': 'alpbproducts:products-list'}
+        observed = REGISTRY.get_sample_value('api_request_queries_count', labels) or 0
+        serialized = REGISTRY.get_sample_value('api_request_serialize_seconds_sum', labels) or 0
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('alpbproducts:products-list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response.headers['Server-Timing'],
+            rf'^db;dur=[\d.]+;desc="{len(context.captured_queries)} queries", '
+            r'serialize;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        self.assertEqual(REGISTRY.get_sample_value('api_request_queries_count', labels),
+                         observed + 1)
+        self.assertGreater(REGISTRY.get_sample_value('api_request_serialize_seconds_sum', labels),
+                           serialized)
+
+
+class ProductSearchTests(AlphabroderTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = cls.create_category()
+        cls.create_style(category, 0, product_number='G5000', short_description='Heavy Cotton Tee')
+        cls.create_style(category, 1, product_number='G500')
+        cls.create_style(category, 2, product_number='2000', short_description='Ultra Cotton Tee',
+                         full_feature_description='Prints like the G500, ringspun yarn')
+        cls.create_style(category, 3, product_number='64000',
+                         full_feature_description='Softstyle ringspun cotton jersey')
+        cls.refresh_catalog()
+
+    def search(self, terms):
+        response = self.client.get(reverse('alpbproducts:products-list'), {'search': terms})
+        self.assertEqual(response.status_code, 200)
+        return [product['product_number'] for product in response.json()['results']]
+
+    def test_exact_product_number_ranks_first(self):
+        self.assertEqual(self.search('g500'), ['G500', 'G5000', '2000'])
+
+    def test_words_match_descriptions(self):
+        self.assertCountEqual(self.search('ringspun cotton'), ['2000', '64000'])
+
+
+class CatalogCachingTests(AlphabroderTestCase):
+    catalog_styles = 1
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('alpbproducts:products-list')
+
+    def describe(self, description):
+        self.sync_class.product_model.objects.update(short_description=description)
+
+    def listed_description(self):
+        return self.client.get(self.url).json()['results'][0]['short_description']
+
+    def test_sync_invalidates_cached_pages(self):
+        self.assertEqual(self.listed_description(), 'Tee')
+        self.describe('Heavy Tee')
+        self.assertEqual(self.listed_description(), 'Tee')
+
+        versions = catalog_version('alpb'), catalog_version('catalog')
+        self.sync_class().invalidate_caches()
+
+        self.assertNotEqual(catalog_version('alpb'), versions[0])
+        self.assertNotEqual(catalog_version('catalog'), versions[1])
+        self.assertEqual(self.listed_description(), 'Heavy Tee')
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_new_version_sends_a_new_response(self):
+        response = self.client.get(self.url)
+        self.describe('Heavy Tee')
+        bump_catalog_version('alpb')
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertNotEqual(revalidated.headers['ETag'], response.headers['ETag'])
+        self.assertEqual(revalidated.json()['results'][0]['short_description'], 'Heavy Tee')
+
+
+class BatchProductsTests(AlphabroderTestCase):
+
+    def batch(self, product_numbers):
+        return self.client.get(reverse('alpbproducts:products-batch'),
+                               {'product_numbers': product_numbers})
+
+    def test_products_keep_the_order_asked_for(self):
+        response = self.batch('G2,G0,G1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['product_number'] for product in response.json()],
+                         ['G2', 'G0', 'G1'])
+        variations = response.json()[0]['variations']
+        self.assertCountEqual([variation['item_number'] for variation in variations],
+                              ['B2S', 'B2M'])
+
+    def test_repeated_and_unknown_products(self):
+        response = self.batch('G1, G9,G1,,G0,G1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['product_number'] for product in response.json()], ['G1', 'G0'])
+
+    def test_too_many_or_no_products_are_rejected(self):
+        too_many = ','.join(f'P{number}' for number in range(101))
+        for product_numbers in (too_many, '', ' , '):
+            with self.subTest(product_numbers=product_numbers[:10]):
+                response = self.batch(product_numbers)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('product_numbers', response.json())
+
+
+class StockTests(AlphabroderTestCase):
+
+    def stock(self, **params):
+        return self.client.get(reverse('alpbproducts:stock'), params)
+
+    def test_lookup_by_item_number(self):
+        response = self.stock(item_numbers='B2M,B0S,B9S')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'item_number': 'B0S', 'gtin': '190000000000', 'quantity': 10,
+             'price_per_piece': '2.50', 'price_per_dozen': None, 'price_per_case': None,
+             'retail_price': '4.50'},
+            {'item_number': 'B2M', 'gtin': '190000000021', 'quantity': 10,
+             'price_per_piece': '2.50', 'price_per_dozen': None, 'price_per_case': None,
+             'retail_price': '4.50'},
+        ])
+
+    def test_lookup_by_gtin_with_or_without_padding(self):
+        response = self.stock(gtins='00190000000010,190000000011,1.90000000020E+11',
+                              item_numbers='B1S')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([variation['item_number'] for variation in response.json()],
+                         ['B1M', 'B1S', 'B2S'])
+
+    def test_numbers_longer_than_a_gtin_match_nothing(self):
+        response = self.stock(gtins='1' * 29 + ',1.9E+40')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_missing_or_too_many_items_are_rejected(self):
+        too_many = ','.join(f'B{number}' for number in range(300))
+        too_many_gtins = ','.join(str(190000000000 + number) for number in range(201))
+        for params in ({}, {'item_numbers': ' , '},
+                       {'item_numbers': too_many, 'gtins': too_many_gtins}):
+            with self.subTest(params=list(params)):
+                response = self.stock(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('item_numbers', response.json())
+
+
+class ExportTests(AlphabroderTestCase):
+    catalog_styles = 2
+
+    def export(self, **params):
+        response = self.client.get(reverse('alpbproducts:export'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_has_a_row_per_variation(self):
+        response, content = self.export()
+
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response.headers['X-Accel-Buffering'], 'no')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertCountEqual([row['item_number'] for row in rows], ['B0S', 'B0M', 'B1S', 'B1M'])
+        row = next(row for row in rows if row['item_number'] == 'B1S')
+        self.assertEqual((row['product_number'], row['brand_name'], row['gtin'],
+                          row['quantity'], row['price_per_piece']),
+                         ('G1', 'Gildan', '190000000010', 10, '2.50'))
+
+    def test_csv_has_a_header_and_a_row_per_variation(self):
+        response, content = self.export(output='csv')
+
+        self.assertEqual(response.headers['Content-Type'], 'text/csv')
+        lines = content.decode().splitlines()
+        self.assertTrue(lines[0].startswith(
+            'product_number,brand_name,short_description,category,item_number,'))
+        rows = list(csv.DictReader(lines))
+        self.assertCountEqual([row['item_number'] for row in rows], ['B0S', 'B0M', 'B1S', 'B1M'])
+        row = next(row for row in rows if row['item_number'] == 'B0M')
+        self.assertEqual((row['product_number'], row['gtin'], row['retail_price']),
+                         ('G0', '190000000001', '4.50'))
+
+    def test_gzip_holds_the_same_export(self):
+        for output in ('ndjson', 'csv'):
+            with self.subTest(output=output):
+                response, compressed = self.export(output=output, compress='gzip')
+                _, content = self.export(output=output)
+
+                self.assertEqual(response.headers['Content-Type'], 'application/gzip')
+                self.assertIn(f'.{output}.gz"', response.headers['Content-Disposition'])
+                self.assertEqual(gzip.decompress(compressed), content)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('alpbproducts:export'), {'output': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('output', response.json())
+
+
+class CategoryListTests(AlphabroderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('alpbproducts:categories-list')
+
+    def test_warm_list_runs_no_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        category = response.json()['results'][0]
+        self.assertEqual((category['category'], category['product_count'],
+                          category['variation_count']), ('Tees', 3, 6))
+
+        # Another URL misses the page cache, the categories are still in process
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(response.json()['results'][0]['category'], 'Tees')
+
+    def test_sync_refreshes_the_list(self):
+        self.client.get(self.url)
+        self.create_style(self.sync_class.category_model.objects.get(), 3)
+        self.refresh_catalog()
+        self.sync_class().invalidate_caches()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['results'][0]['product_count'], 4)
+
+
+class AlphabroderSyncTests(FeedSyncMixin, AlphabroderTestCase):
+    catalog_styles = 0
+    product_header = [
+        'Item Number', 'Style', 'Category', 'Short Description', 'Mill Name',
+        'Full Feature Description', 'Color Name', 'Color Code', 'Hex Code', 'Size Code',
+        'Size', 'Case Qty', 'Weight', 'Front Image Hi Res URL', 'Back Image Hi Res URL',
+        'Side Image Hi Res URL', 'Gtin',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.serve_feeds({
+            Process_alp_inventory.product_file: self.products(
+                self.product('B0S', 'G0', 'S', '00190000000001'),
+                self.product('B0M', 'G0', 'M', '1.9E+11'),
+                self.product('B1S', 'G1', 'S', '190000000010', category='Polos'),
+                # A blank GTIN and a short line miss required values
+                self.product('B1M', 'G1', 'M', ''),
+                'B2S^G2^Tees',
+                # Repeated items keep their first line
+                self.product('B0S', 'G0', 'S', '00190000000001', color='White'),
+                # Too many fields
+                self.product('B3S', 'G3', 'S', '190000000030') + '^extra',
+            ),
+            Process_alp_inventory.inventory_file: self.inventory(
+                'B0S,00190000000001,5,3',
+                'B0M,1.9E+11,2',
+                'B1S,190000000010,,7',
+                'B9S,190000000090,1',
+                # Repeated items keep their last line
+                'B0M,1.9E+11,4',
+            ),
+            Process_alp_inventory.price_file: self.pricing(
+                'B0S^00190000000001^$2.50^2.40^2.30^4.99',
+                'B0M^1.9E+11^2.50^2.40^2.30^5.99',
+                'B1S^190000000010^3.00^2.90^2.80^6.00',
+            ),
+        })
+
+    def product(self, item_number, style, size, gtin, category='Tees', color='Black'):
+        images = [f'{IMAGE_URL}{item_number}_{side}.jpg' for side in 'fbs']
+        return '^'.join([item_number, style, category, 'Tee', 'Gildan', 'Cotton tee', color,
+                         'BLK', '000000', size, size, '72', '0.5', *images, gtin])
+
+    def products(self, *lines):
+        return '\n'.join(['^'.join(self.product_header), *lines, '']).encode()
+
+    def inventory(self, *lines):
+        header = ','.join(['Item Number', 'GTIN Number', *Process_alp_inventory.warehouses])
+        return '\n'.join([header, *lines, '']).encode()
+
+    def pricing(self, *lines):
+        return '\n'.join(['Item Number ^Gtin^Piece^Dozen^Case^Retail', *lines, '']).encode()
+
+    def variations(self):
+        return {
+            variation.item_number: (variation.gtin, variation.quantity,
+                                    str(variation.price_per_piece), str(variation.retail_price),
+                                    variation.color_name)
+            for variation in Variations.objects.all()
+        }
+
+    def assertRunCounts(self, **counts):
+        run = SyncRun.objects.filter(vendor='alpb').latest('started_at')
+        self.assertEqual(run.state, SyncRun.FINISHED)
+        self.assertEqual({outcome: getattr(run, f'rows_{outcome}') for outcome in counts},
+                         counts)
+
+    def test_first_load(self):
+        version = catalog_version('alpb')
+        self.sync()
+
+        self.assertRunCounts(created=3, updated=6, skipped=3, errored=3)
+        self.assertEqual(self.variations(), {
+            'B0S': ('190000000001', 8, '2.50', '4.99', 'Black'),
+            'B0M': ('190000000000', 4, '2.50', '5.99', 'Black'),
+            'B1S': ('190000000010', 7, '3.00', '6.00', 'Black'),
+        })
+        self.assertEqual(Variations.objects.get(item_number='B0S').warehouse_quantities,
+                         {warehouse: {'CC': 5, 'CN': 3}.get(warehouse, 0)
+                          for warehouse in Process_alp_inventory.warehouses})
+        self.assertEqual(
+            {summary.product.product_number: (str(summary.min_price), str(summary.max_price),
+                                              summary.quantity, summary.variation_count)
+             for summary in ProductSummary.objects.select_related('product')},
+            {'G0': ('4.99', '5.99', 12, 2), 'G1': ('6.00', '6.00', 7, 1)},
+        )
+        self.assertEqual(
+            {category.category: (category.product_count, category.variation_count)
+             for category in Category.objects.all()},
+            {'Tees': (1, 2), 'Polos': (1, 1)},
+        )
+        self.assertCountEqual(
+            VendorVariation.objects.filter(vendor='alpb').values_list('item_number', 'gtin'),
+            [('B0S', '190000000001'), ('B0M', '190000000000'), ('B1S', '190000000010')],
+        )
+        self.assertNotEqual(catalog_version('alpb'), version)
+
+    def test_reload_of_unchanged_rows_updates_nothing(self):
+        self.sync()
+        variations = self.variations()
+
+        self.sync(force=True)
+
+        self.assertRunCounts(created=0, updated=0)
+        self.assertEqual(self.variations(), variations)
+
+    def test_changed_quantity_and_price(self):
+        self.sync()
+        self.upload(Process_alp_inventory.inventory_file, self.inventory(
+            'B0S,00190000000001,9,3',
+            'B0M,1.9E+11,4',
+            'B1S,190000000010,,7',
+        ))
+        self.upload(Process_alp_inventory.price_file, self.pricing(
+            'B0S^00190000000001^$2.50^2.40^2.30^4.99',
+            'B0M^1.9E+11^2.50^2.40^2.30^5.99',
+            'B1S^190000000010^3.50^2.90^2.80^7.00',
+        ))
+
+        self.sync()
+
+        self.assertRunCounts(created=0, updated=2, errored=0)
+        self.assertEqual(self.variations()['B0S'][:2], ('190000000001', 12))
+        self.assertEqual(self.variations()['B1S'][2:4], ('3.50', '7.00'))
+        self.assertEqual(ProductSummary.objects.get(product__product_number='G0').quantity, 16)
+        polos = Category.objects.get(category='Polos')
+        self.assertEqual((str(polos.min_price), str(polos.max_price)), ('7.00', '7.00'))
+        self.assertEqual(str(VendorVariation.objects.get(item_number='B1S').price_per_piece),
+                         '3.50')
+
+    def test_existing_variations_are_skipped(self):
+        self.sync()
+        self.upload(Process_alp_inventory.product_file, self.products(
+            self.product('B0S', 'G0', 'S', '00190000000001', color='White'),
+            self.product('B2S', 'G2', 'S', '190000000020'),
+        ))
+
+        self.sync()
+        self.assertRunCounts(created=1, updated=0)
+        self.assertEqual(self.variations()['B0S'][4], 'Black')
+        self.assertEqual(self.variations()['B2S'][:2], ('190000000020', None))
+
+        with mock.patch.object(Process_alp_inventory, '_skip_existing', False):
+            self.sync(force=True)
+        self.assertEqual(self.variations()['B0S'][4], 'White')
+
+    def test_failed_refresh_is_retried_by_the_next_sync(self):
+        refresh_summaries = Process_alp_inventory.refresh_summaries
+        with mock.patch.object(Process_alp_inventory, 'refresh_summaries',
+                               side_effect=RuntimeError('refresh failed')):
+            with self.assertRaises(RuntimeError):
+                self.sync()
+        self.assertEqual(len(self.variations()), 3)
+        self.assertFalse(ProductSummary.objects.exists())
+        self.assertFalse(FeedFile.objects.exists())
+
+        with mock.patch.object(Process_alp_inventory, 'refresh_summaries',
+                               autospec=True, side_effect=refresh_summaries):
+            process = self.sync()
+        self.assertEqual(len(process.files), 3)
+        self.assertEqual(ProductSummary.objects.count(), 2)
+        self.assertEqual(FeedFile.objects.count(), 3)
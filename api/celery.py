@@ -1,9 +1,32 @@
 import os
+import shutil
 
 from celery import Celery
+from celery.signals import worker_init
 from decouple import config
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", config("DJANGO_SETTINGS_MODULE"))
 app = Celery("api")
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Serve the sync metrics of the worker for Prometheus to scrape.
+      Tasks run in child processes, so with PROMETHEUS_MULTIPROC_DIR
+      set their metrics are shared through files in that directory."""
+    from django.conf import settings
+    from prometheus_client import REGISTRY, CollectorRegistry, multiprocess, start_http_server
+
+    if not settings.SYNC_METRICS_PORT:
+        return
+    registry = REGISTRY
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        # Files left by a previous worker would be counted again
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(settings.SYNC_METRICS_PORT, registry=registry)
\ No newline at end of file
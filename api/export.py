@@ -0,0 +1,81 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo():
+    """File-like object handing back what is written to it, so
+      `csv.writer` can format one row at a time."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(fields, rows):
+    """Encode rows as one JSON object per line."""
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def csv_lines(fields, rows):
+    """Encode rows as CSV lines, after a header line."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def buffered(lines, size=64 * 1024):
+    """Join lines into chunks of about `size` bytes, so the server
+      doesn't write to the socket once per row."""
+    chunk = []
+    length = 0
+    for line in lines:
+        line = line.encode()
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def gzipped(chunks, level=6):
+    """Compress a stream of byte chunks into a gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(fields, rows, export_format='ndjson', compress=False, filename='export'):
+    """Stream `rows`, tuples of values for `fields`, as an NDJSON or CSV
+      file download, gzipped if `compress`. Rows are encoded as they are
+      sent, so an iterator over a queryset keeps memory flat."""
+    lines = csv_lines(fields, rows) if export_format == 'csv' else ndjson_lines(fields, rows)
+    content = buffered(lines)
+    content_type = EXPORT_FORMATS[export_format]
+    filename = f'{filename}.{export_format}'
+    if compress:
+        content = gzipped(content)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Sent on as it is produced, nginx would otherwise spool it to disk
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
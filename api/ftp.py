@@ -0,0 +1,273 @@
+import io
+import os
+import hashlib
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from ftplib import FTP, FTP_TLS, all_errors, error_perm, error_temp
+
+# Errors worth retrying a transfer for, permanent replies like a missing
+# file fail the same way on every attempt
+TRANSIENT_ERRORS = (error_temp, OSError, EOFError)
+
+
+class VendorFTPClient():
+    """FTP client shared by the vendor syncs. Logged in sessions are
+      pooled and reused across downloads, transfers resume with REST
+      when a connection drops, and files can be streamed while they
+      download."""
+
+    def __init__(self, host, user, password, port=21, tls=False,
+                 ssl_context=None, timeout=30, blocksize=1024 * 1024,
+                 retries=3, debuglevel=0):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.port = port
+        self.tls = tls
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.blocksize = blocksize
+        self.retries = retries
+        self.debuglevel = debuglevel
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.logins = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    #####################################################
+    #                      Sessions                     #
+    #####################################################
+    def connect(self):
+        """Open and log in a new session."""
+        if self.tls:
+            ftp = FTP_TLS(context=self.ssl_context, timeout=self.timeout)
+        else:
+            ftp = FTP(timeout=self.timeout)
+        ftp.set_debuglevel(self.debuglevel)
+        ftp.connect(self.host, self.port)
+        ftp.set_pasv(True)
+        ftp.login(user=self.user, passwd=self.password)
+        if self.tls:
+            ftp.prot_p()  # Explicit FTP over TLS
+        ftp.voidcmd('TYPE I')
+
+        with self._lock:
+            self.logins += 1
+        return ftp
+
+    @contextmanager
+    def session(self):
+        """Borrow a logged in session from the pool, opening one when
+          none is idle. Sessions that fail are dropped, not reused."""
+        ftp = None
+        while ftp is None:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                ftp = self.connect()
+                break
+            try:
+                ftp.voidcmd('NOOP')
+            except all_errors:
+                # Timed out by the server while idle
+                self.discard(ftp)
+                ftp = None
+
+        try:
+            yield ftp
+        except BaseException:
+            self.discard(ftp)
+            raise
+        else:
+            self._idle.put(ftp)
+
+    def discard(self, ftp):
+        """Close a session without waiting on a broken connection."""
+        try:
+            ftp.close()
+        except all_errors:
+            pass
+
+    def close(self):
+        """Log out of every idle session."""
+        while True:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                ftp.quit()
+            except all_errors:
+                self.discard(ftp)
+
+    #####################################################
+    #                     Transfers                     #
+    #####################################################
+    def stat(self, path):
+        """Return the size and MDTM timestamp of a remote file, with
+          None for values the server doesn't report."""
+        with self.session() as ftp:
+            size = self._size(ftp, path)
+            try:
+                modified = ftp.voidcmd(f'MDTM {path}').split()[-1]
+            except error_perm:
+                modified = None
+        return size, modified
+
+    def retrieve(self, path, callback):
+        """Pass the blocks of a remote file to `callback`. When the
+          connection drops the transfer is retried on a new session from
+          where it stopped, giving up after `retries` attempts in a row
+          that make no progress. Permanent errors are raised right away.
+          Returns the number of bytes received."""
+        received = 0
+        failures = 0
+
+        def receive(block):
+            nonlocal received
+            callback(block)
+            received += len(block)
+
+        while True:
+            resumed_at = received
+            try:
+                with self.session() as ftp:
+                    if received and received == self._size(ftp, path):
+                        return received
+                    ftp.retrbinary(f'RETR {path}', receive,
+                                   blocksize=self.blocksize, rest=received or None)
+                return received
+            except TRANSIENT_ERRORS:
+                failures = 0 if received > resumed_at else failures + 1
+                if failures > self.retries:
+                    raise
+
+    def download(self, path, local_path):
+        """Download a remote file to `local_path` through a `.part`
+          file. Returns the number of bytes transferred."""
+        part_path = local_path + '.part'
+        with open(part_path, 'wb', buffering=self.blocksize) as local_file:
+            transferred = self.retrieve(path, local_file.write)
+
+        os.replace(part_path, local_path)
+        return transferred
+
+    def stream(self, path, local_path=None, queue_size=64):
+        """Start downloading a remote file in the background and return
+          a readable binary stream of its content. See `FeedStream`."""
+        return FeedStream(self, path, local_path, queue_size)
+
+    def _size(self, ftp, path):
+        try:
+            return ftp.size(path)
+        except error_perm:
+            return None
+
+
+class StreamCancelled(Exception):
+    """Raised in the download thread when the reader closes early."""
+
+
+class FeedStream(io.RawIOBase):
+    """Readable binary stream over a file downloaded by a background
+      thread. Blocks pass through a bounded queue, so the download runs
+      at most `queue_size` blocks ahead of the reader and network time
+      overlaps with whatever the reader does with the data.
+      The content is also saved to `local_path`, if given, and `checksum`
+      holds its SHA-256 hex digest once the stream is `complete`. `wait`
+      is the time the reader spent blocked on the network."""
+
+    def __init__(self, client, path, local_path=None, queue_size=64):
+        super().__init__()
+        self.name = path
+        self.local_path = local_path
+        self.size = 0
+        self.checksum = None
+        self.complete = False
+        self.wait = 0.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._block = memoryview(b'')
+        self._eof = False
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._download, args=(client,),
+                                        name=f'ftp-{os.path.basename(path)}',
+                                        daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._block and not self._eof:
+            started = time.perf_counter()
+            block = self._queue.get()
+            self.wait += time.perf_counter() - started
+            if isinstance(block, BaseException):
+                self._eof = True
+                raise block
+            if block is None:
+                self._eof = True
+            else:
+                self._block = memoryview(block)
+
+        count = min(len(buffer), len(self._block))
+        buffer[:count] = self._block[:count]
+        self._block = self._block[count:]
+        return count
+
+    def close(self):
+        """Stop the download if it is still running."""
+        if not self.closed:
+            self._cancelled.set()
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        super().close()
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise StreamCancelled
+
+    def _download(self, client):
+        digest = hashlib.sha256()
+        part_path = self.local_path and self.local_path + '.part'
+        local_file = open(part_path, 'wb', buffering=client.blocksize) if part_path else None
+
+        def receive(block):
+            self._put(block)
+            digest.update(block)
+            if local_file:
+                local_file.write(block)
+
+        try:
+            self.size = client.retrieve(self.name, receive)
+            if local_file:
+                local_file.close()
+                os.replace(part_path, self.local_path)
+            self.checksum = digest.hexdigest()
+            self.complete = True
+            self._put(None)
+        except StreamCancelled:
+            pass
+        except BaseException as e:
+            try:
+                self._put(e)
+            except StreamCancelled:
+                pass
+        finally:
+            if local_file:
+                local_file.close()
@@ -0,0 +1,99 @@
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.db import connections
+from prometheus_client import Histogram
+
+
+# Observed per view, named like 'alpbproducts:products-list'
+REQUEST_SECONDS = Histogram('api_request_seconds', 'Latency of API requests.', ['view'])
+REQUEST_DB_SECONDS = Histogram('api_request_db_seconds',
+                               'Time API requests spent in database queries.', ['view'])
+REQUEST_SERIALIZE_SECONDS = Histogram('api_request_serialize_seconds',
+                                      'Time API views spent outside database queries, '
+                                      'mostly serializing.', ['view'])
+REQUEST_QUERIES = Histogram('api_request_queries', 'Database queries run by API requests.',
+                            ['view'], buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile():
+    """Queries and serializer time of the request being profiled. It
+      is also the database execute wrapper counting the queries."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self._view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+
+class ProfiledViewMixin():
+    """Time the view of a profiled request apart from its database
+      queries, which leaves mostly its serializers. Views opt in by
+      inheriting it, outside a profiled request it does nothing."""
+
+    def initial(self, request, *args, **kwargs):
+        profile = current_profile.get()
+        if profile:
+            profile._view_started = (time.perf_counter(), profile.db)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = current_profile.get()
+        if profile and profile._view_started:
+            started, db = profile._view_started
+            profile.serialize += time.perf_counter() - started - (profile.db - db)
+            profile._view_started = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class QueryProfilingMiddleware():
+    """Profile each request: count its database queries and time them,
+      the serializers of views using ProfiledViewMixin and the whole
+      request. The figures are sent in a Server-Timing header and
+      observed in histograms per view.
+      Opt-in, installed first in MIDDLEWARE when PROFILE_REQUESTS is
+      set. Streamed content runs its queries after the middleware, so
+      they aren't counted."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        total = time.perf_counter() - started
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db * 1000:.1f};desc="{profile.queries} queries"',
+            f'serialize;dur={profile.serialize * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        # Unresolved URLs aren't observed, their paths are unbounded
+        match = request.resolver_match
+        if match:
+            REQUEST_SECONDS.labels(match.view_name).observe(total)
+            REQUEST_DB_SECONDS.labels(match.view_name).observe(profile.db)
+            REQUEST_SERIALIZE_SECONDS.labels(match.view_name).observe(profile.serialize)
+            REQUEST_QUERIES.labels(match.view_name).observe(profile.queries)
+        return response
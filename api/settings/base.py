@@ -39,11 +39,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     "rest_framework",
     "drf_spectacular",
     'alphabroder',
     'sanmar',
+    'catalog',
 ]
 
 MIDDLEWARE = [
@@ -143,6 +145,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Celery
 CELERY_BROKER_URL = config("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = config("REDIS_BACKEND")
+CELERY_TASK_TRACK_STARTED = True
 
 
 # DRF Spectacular
@@ -174,4 +177,42 @@ AB_FTP_PASSWORD = config("AB_FTP_PASSWORD")
 # Sanmar Credentials
 SANMAR_FTP_HOST = config("SANMAR_FTP_HOST")
 SANMAR_FTP_USER = config("SANMAR_FTP_USER")
-SANMAR_FTP_PASSWORD = config("SANMAR_FTP_PASSWORD")
\ No newline at end of file
+SANMAR_FTP_PASSWORD = config("SANMAR_FTP_PASSWORD")
+
+# Vendor sync
+SYNC_QUEUE_SIZE = config("SYNC_QUEUE_SIZE", default=64, cast=int)
+# Seconds a vendor stays locked to the job syncing it, in case the job dies
+SYNC_LOCK_SECONDS = config("SYNC_LOCK_SECONDS", default=3 * 60 * 60, cast=int)
+# Port the Celery worker serves its Prometheus metrics on, 0 to disable
+SYNC_METRICS_PORT = config("SYNC_METRICS_PORT", default=0, cast=int)
+# Bearer token scrapers send to the web metrics endpoint, empty to disable it
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+# Seconds the sync history served by the metrics endpoint is reused
+METRICS_CACHE_SECONDS = config("METRICS_CACHE_SECONDS", default=30, cast=int)
+
+# Catalog export
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+CATEGORY_CACHE_SECONDS = config("CATEGORY_CACHE_SECONDS", default=60, cast=int)
+
+# Request profiling, adds Server-Timing headers and per view histograms
+PROFILE_REQUESTS = config("PROFILE_REQUESTS", default=False, cast=bool)
+if PROFILE_REQUESTS:
+    MIDDLEWARE.insert(0, "api.profiling.QueryProfilingMiddleware")
+
+# Logging, the vendor syncs log one summary line per run at INFO
+SYNC_LOG_LEVEL = config("SYNC_LOG_LEVEL", default="INFO")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "timestamped": {"format": "<{asctime}> {levelname} {name}: {message}", "style": "{"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "timestamped"},
+    },
+    "loggers": {
+        app: {"handlers": ["console"], "level": SYNC_LOG_LEVEL, "propagate": False}
+        for app in ("alphabroder", "sanmar", "catalog")
+    },
+}
\ No newline at end of file
@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.ioloop import IOLoop
+from pyftpdlib.servers import ThreadedFTPServer
+
+from catalog.vendor_views import categories_cache
+
+from .ftp import VendorFTPClient
+
+
+class CatalogFixtureMixin():
+    """Build a small catalog in the tables of a vendor sync: styles G0,
+      G1 and G2 of one category, in sizes S and M, with the summaries,
+      category counts, search vectors and GTIN index the sync derives."""
+
+    sync_class = None
+
+    # Required variation fields only some vendors have
+    variation_fields = {}
+
+    @classmethod
+    def create_catalog(cls, styles=3):
+        category = cls.create_category()
+        for style in range(styles):
+            cls.create_style(category, style)
+        cls.refresh_catalog()
+
+    @classmethod
+    def create_category(cls, name='Tees'):
+        return cls.sync_class.category_model.objects.create(
+            category=name, category_image=f'{name.lower()}.jpg',
+        )
+
+    @classmethod
+    def create_style(cls, category, style, **fields):
+        """Create style G{style} with items B{style}S and B{style}M,
+          `fields` overriding those of the product."""
+        product = cls.sync_class.product_model.objects.create(**{
+            'product_number': f'G{style}', 'brand_name': 'Gildan',
+            'short_description': 'Tee', 'category': category,
+            'full_feature_description': 'Cotton tee', **fields,
+        })
+        for index, size in enumerate(('S', 'M')):
+            cls.sync_class.variation_model.objects.create(
+                item_number=f'B{style}{size}', product_number=product,
+                color_name='Black', hex_code='000000', size=size, case_qty=72,
+                weight='0.5', front_image='f.jpg', back_image='b.jpg',
+                gtin=f'1900000000{style}{index}', quantity=10,
+                price_per_piece='2.50', retail_price='4.50', **cls.variation_fields,
+            )
+        return product
+
+    @classmethod
+    def refresh_catalog(cls):
+        """Refresh what the sync derives from the catalog tables."""
+        process = cls.sync_class()
+        process.refresh_summaries()
+        process.refresh_search_vectors()
+        process.refresh_gtin_index()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogTestCase(CatalogFixtureMixin, TestCase):
+    """Test case over the fixture catalog of `sync_class`, built once
+      for the class with `catalog_styles` styles, none for tests that
+      load their own. The cache is kept in memory and emptied before
+      each test with the in-process categories, so what one test cached
+      isn't served to another."""
+
+    catalog_styles = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        if cls.catalog_styles:
+            cls.create_catalog(styles=cls.catalog_styles)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        categories_cache.clear()
+
+
+class QueryPlanMixin():
+    """Check the plans of the queries a request runs."""
+
+    large_tables = ()
+
+    def full_scans(self, plan):
+        """Return the large tables a plan reads in full to filter them,
+          sequentially or through an index walked without a condition."""
+        tables = []
+        if plan.get('Relation Name') in self.large_tables and (
+            plan['Node Type'] == 'Seq Scan'
+            or 'Filter' in plan and 'Index Cond' not in plan
+        ):
+            tables.append(plan['Relation Name'])
+        for child in plan.get('Plans', []):
+            tables += self.full_scans(child)
+        return tables
+
+    def assertNoSeqScan(self, url):
+        """Request `url` and EXPLAIN each query it ran with sequential
+          scans disabled. The planner still scans a whole table when no
+          index can answer the query, which fails the test. An empty
+          response fails too, its plans would prove nothing."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data.get('results') if isinstance(data, dict) and 'results' in data
+                        else data, f"{url} returned no rows")
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for query in context.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {query['sql']}")
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                self.assertEqual(self.full_scans(plan[0]['Plan']), [],
+                                 f"{url} scanned a whole table: {query['sql']}")
+
+
+class QueryCountMixin():
+    """Check the number of queries a request runs."""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, param='page_size', values=(1, 3)):
+        """Request `url` with `param` set to each of `values`, growing
+          pages, and fail if the number of queries grows with the page.
+          That is the sign of a query per row, an N+1."""
+        separator = '&' if '?' in url else '?'
+        counts = {value: self.count_queries(f'{url}{separator}{urlencode({param: value})}')
+                  for value in values}
+        self.assertEqual(len(set(counts.values())), 1,
+                         f"Queries run by {url} grow with {param}: {counts}")
+
+
+class LocalFTPServerMixin():
+    """Serve a temporary directory over FTP with pyftpdlib."""
+
+    def start_ftp_server(self, files):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        for filename, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(root, filename)), exist_ok=True)
+            with open(os.path.join(root, filename), 'wb') as remote_file:
+                remote_file.write(content)
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user('vendor', 'secret', root, perm='elr')
+        handler = type('Handler', (FTPHandler,), {'authorizer': authorizer})
+        server = ThreadedFTPServer(('127.0.0.1', 0), handler, ioloop=IOLoop())
+        stopped = threading.Event()
+
+        # The server has to be closed from the thread serving it
+        def serve():
+            while not stopped.is_set():
+                server.serve_forever(timeout=0.01, blocking=False)
+            server.close_all()
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stopped.set)
+        return root, server.address[1]
+
+    def local_dir(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return directory
+
+
+class FeedSyncMixin(LocalFTPServerMixin):
+    """Run the syncs of the test case's `sync_class` against vendor
+      files served over FTP from a temporary directory, with the local
+      copies kept in another one."""
+
+    def serve_feeds(self, files):
+        self.root, port = self.start_ftp_server(files)
+        self.uploads = 0
+        cwd = os.getcwd()
+        os.chdir(self.local_dir())
+        self.addCleanup(os.chdir, cwd)
+
+        client = mock.patch.object(
+            self.sync_class, 'ftp_client',
+            lambda process: VendorFTPClient('127.0.0.1', 'vendor', 'secret', port=port),
+        )
+        client.start()
+        self.addCleanup(client.stop)
+
+    def upload(self, filename, content):
+        """Replace a served file, under a new timestamp."""
+        path = os.path.join(self.root, filename)
+        with open(path, 'wb') as remote_file:
+            remote_file.write(content)
+        self.uploads += 1
+        modified = 1700000000 + 60 * self.uploads
+        os.utime(path, (modified, modified))
+
+    def sync(self, **options):
+        """Run a sync as the task does, its commit hooks included. Its
+          log records are kept on the process as `logs`."""
+        process = self.sync_class(**options)
+        with self.assertLogs(process.logger.logger, 'DEBUG') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            process.handle()
+        process.logs = logs.output
+        return process
@@ -24,4 +24,5 @@ urlpatterns = [
     path("", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/alpb/", include("alphabroder.urls", namespace="alpbproducts")),
     path("api/snmr/", include("sanmar.urls", namespace="snmrproducts")),
+    path("api/catalog/", include("catalog.urls", namespace="catalog")),
 ]
\ No newline at end of file
@@ -0,0 +1,709 @@
+import os
+import io
+import re
+import csv
+import json
+import time
+import hashlib
+import shutil
+import logging
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.caching import bump_catalog_version
+from api.ftp import VendorFTPClient
+
+from .metrics import record_sync
+from .models import SyncRun, VendorVariation
+
+
+#####################################################
+#                   Cleaning SQL                    #
+#####################################################
+def clean_integer(column):
+    """SQL expression casting a staged text column to an integer,
+      or NULL when it isn't a whole number."""
+    return (f"CASE WHEN trim({column}) ~ '^-?[0-9]+(\\.0*)?$' "
+            f"THEN trim({column})::numeric::integer END")
+
+
+def clean_numeric(column):
+    """SQL expression keeping only the digits and dots of a staged
+      text column and casting the result to a decimal."""
+    cleaned = f"regexp_replace({column}, '[^0-9.]', '', 'g')"
+    return (f"CASE WHEN {cleaned} ~ '^([0-9]+\\.?[0-9]*|\\.[0-9]+)$' "
+            f"THEN {cleaned}::numeric(10, 2) END")
+
+
+def clean_gtin(column):
+    """SQL expression normalizing a staged GTIN. Whole numbers lose
+      their leading zeros and any decimals or exponent, other values
+      are only trimmed."""
+    value = f"trim({column})"
+    return (f"CASE WHEN {value} ~ '^[+-]?([0-9]+\\.?[0-9]*|\\.[0-9]+)([eE][+-]?[0-9]+)?$' "
+            f"THEN CASE WHEN {value}::numeric % 1 = 0 THEN trunc({value}::numeric)::text "
+            f"ELSE {value} END "
+            f"ELSE coalesce({value}, '') END")
+
+
+NUMBER_RE = re.compile(r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$')
+
+
+def normalize_gtin(gtin):
+    """Normalize a GTIN asked for by a client the way `clean_gtin`
+      normalizes the stored ones, so zero padded GTIN-14s match.
+      Decimals and exponents are only read when they fit in the 14
+      digits of a GTIN, longer numbers are passed through."""
+    gtin = gtin.strip()
+    if gtin.isdigit():
+        return gtin.lstrip('0') or '0'
+    if NUMBER_RE.match(gtin):
+        number = Decimal(gtin)
+        if number.adjusted() < 14 and number == number.to_integral_value():
+            return str(int(number))
+    return gtin
+
+
+#####################################################
+#                  Stage Statements                 #
+#####################################################
+# Counts the rows a merge inserted and updated, updated rows have an xmax
+MERGE_COUNTS_SQL = """
+    WITH merged AS ({merge} RETURNING (xmax = 0) AS created)
+    SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created)
+    FROM merged
+"""
+
+# Keep one line per key, the first or last one of the file
+DEDUPLICATE_STAGE_SQL = """
+    DELETE FROM {stage} s
+    USING {stage} t
+    WHERE s.{key} = t.{key} AND s._line {comparison} t._line
+"""
+
+
+#####################################################
+#                 Summary Statements                #
+#####################################################
+# Statements shared by every vendor, formatted with its table names.
+# Listing details of each product, recomputed from its variations.
+# Colors and sizes are listed in the order their first item appears
+REFRESH_SUMMARIES_SQL = """
+    WITH prices AS (
+        SELECT product_number_id, min(retail_price) AS min_price,
+               max(retail_price) AS max_price, sum(quantity) AS quantity,
+               count(*) AS variation_count,
+               (array_agg(front_image ORDER BY created_at DESC, item_number))[1] AS front_image
+        FROM {variations}
+        GROUP BY product_number_id
+    ), colors AS (
+        SELECT product_number_id, jsonb_agg(color_name ORDER BY first_item) AS colors
+        FROM (SELECT product_number_id, color_name, min(item_number) AS first_item
+              FROM {variations}
+              GROUP BY product_number_id, color_name) c
+        GROUP BY product_number_id
+    ), sizes AS (
+        SELECT product_number_id, jsonb_agg(size ORDER BY first_item) AS sizes
+        FROM (SELECT product_number_id, size, min(item_number) AS first_item
+              FROM {variations}
+              GROUP BY product_number_id, size) s
+        GROUP BY product_number_id
+    )
+    INSERT INTO {summaries} (product_id, min_price, max_price, quantity,
+                             variation_count, front_image, colors, sizes,
+                             updated_at)
+    SELECT product_number_id, min_price, max_price, quantity, variation_count,
+           front_image, colors, sizes, now()
+    FROM prices JOIN colors USING (product_number_id) JOIN sizes USING (product_number_id)
+    ON CONFLICT (product_id) DO UPDATE SET
+        min_price = EXCLUDED.min_price,
+        max_price = EXCLUDED.max_price,
+        quantity = EXCLUDED.quantity,
+        variation_count = EXCLUDED.variation_count,
+        front_image = EXCLUDED.front_image,
+        colors = EXCLUDED.colors,
+        sizes = EXCLUDED.sizes,
+        updated_at = EXCLUDED.updated_at
+    WHERE ({summaries}.min_price, {summaries}.max_price, {summaries}.quantity,
+           {summaries}.variation_count, {summaries}.front_image,
+           {summaries}.colors, {summaries}.sizes)
+          IS DISTINCT FROM
+          (EXCLUDED.min_price, EXCLUDED.max_price, EXCLUDED.quantity,
+           EXCLUDED.variation_count, EXCLUDED.front_image, EXCLUDED.colors,
+           EXCLUDED.sizes)
+"""
+
+DELETE_STALE_SUMMARIES_SQL = """
+    DELETE FROM {summaries} s
+    WHERE NOT EXISTS (SELECT 1 FROM {variations} v WHERE v.product_number_id = s.product_id)
+"""
+
+# Counts and price range of each category, from the product summaries
+REFRESH_CATEGORIES_SQL = """
+    UPDATE {categories} c
+    SET product_count = s.product_count, variation_count = s.variation_count,
+        min_price = s.min_price, max_price = s.max_price, updated_at = now()
+    FROM (
+        SELECT c.category, count(p.product_id) AS product_count,
+               coalesce(sum(ps.variation_count), 0) AS variation_count,
+               min(ps.min_price) AS min_price, max(ps.max_price) AS max_price
+        FROM {categories} c
+        LEFT JOIN {products} p ON p.category_id = c.category
+        LEFT JOIN {summaries} ps ON ps.product_id = p.product_id
+        GROUP BY c.category
+    ) s
+    WHERE c.category = s.category
+      AND (c.product_count, c.variation_count, c.min_price, c.max_price)
+          IS DISTINCT FROM
+          (s.product_count, s.variation_count, s.min_price, s.max_price)
+"""
+
+# Weighted full text of each product for search, style number first
+UPDATE_SEARCH_VECTORS_SQL = """
+    UPDATE {products} p
+    SET search_vector = s.search_vector
+    FROM (
+        SELECT q.product_id,
+               setweight(to_tsvector('english', q.product_number), 'A') ||
+               setweight(to_tsvector('english', q.brand_name || ' ' || q.short_description), 'B') ||
+               setweight(to_tsvector('english', coalesce(c.colors, '')), 'C') ||
+               setweight(to_tsvector('english', q.full_feature_description), 'D') AS search_vector
+        FROM {products} q
+        LEFT JOIN (SELECT product_number_id, string_agg(DISTINCT color_name, ' ') AS colors
+                   FROM {variations}
+                   GROUP BY product_number_id) c ON c.product_number_id = q.product_id
+    ) s
+    WHERE p.product_id = s.product_id
+      AND p.search_vector IS DISTINCT FROM s.search_vector
+"""
+
+# The vendor's variations with a GTIN, copied to the cross-vendor index
+REFRESH_GTIN_INDEX_SQL = """
+    INSERT INTO {index} (vendor, item_number, gtin, product_number, brand_name,
+                         color_name, size, quantity, price_per_piece,
+                         price_per_dozen, price_per_case, retail_price, updated_at)
+    SELECT %s, v.item_number, v.gtin, p.product_number, p.brand_name,
+           v.color_name, v.size, v.quantity, v.price_per_piece,
+           v.price_per_dozen, v.price_per_case, v.retail_price, now()
+    FROM {variations} v
+    JOIN {products} p ON p.product_id = v.product_number_id
+    WHERE v.gtin <> ''
+    ON CONFLICT (vendor, item_number) DO UPDATE SET
+        gtin = EXCLUDED.gtin,
+        product_number = EXCLUDED.product_number,
+        brand_name = EXCLUDED.brand_name,
+        color_name = EXCLUDED.color_name,
+        size = EXCLUDED.size,
+        quantity = EXCLUDED.quantity,
+        price_per_piece = EXCLUDED.price_per_piece,
+        price_per_dozen = EXCLUDED.price_per_dozen,
+        price_per_case = EXCLUDED.price_per_case,
+        retail_price = EXCLUDED.retail_price,
+        updated_at = EXCLUDED.updated_at
+    WHERE ({index}.gtin, {index}.product_number, {index}.brand_name,
+           {index}.color_name, {index}.size, {index}.quantity,
+           {index}.price_per_piece, {index}.price_per_dozen,
+           {index}.price_per_case, {index}.retail_price)
+          IS DISTINCT FROM
+          (EXCLUDED.gtin, EXCLUDED.product_number, EXCLUDED.brand_name,
+           EXCLUDED.color_name, EXCLUDED.size, EXCLUDED.quantity,
+           EXCLUDED.price_per_piece, EXCLUDED.price_per_dozen,
+           EXCLUDED.price_per_case, EXCLUDED.retail_price)
+"""
+
+DELETE_STALE_GTIN_INDEX_SQL = """
+    DELETE FROM {index} i
+    WHERE i.vendor = %s
+      AND NOT EXISTS (SELECT 1 FROM {variations} v
+                      WHERE v.item_number = i.item_number AND v.gtin <> '')
+"""
+
+
+def file_checksum(path, blocksize=1024 * 1024):
+    """SHA-256 hex digest of a local file, the way FeedStream computes
+      it for streamed files."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as local_file:
+        for block in iter(lambda: local_file.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CsvCopyStream():
+    """File-like object feeding parsed CSV rows to COPY FROM STDIN,
+      keeping only the fields at the given indexes. Lines with too many
+      fields are dropped and short lines padded, the same way pandas
+      treats them with error_bad_lines=False. The first few dropped
+      lines are kept in `samples` for logging."""
+
+    def __init__(self, reader, width, indexes, sample_size=5):
+        self._reader = reader
+        self._width = width
+        self._indexes = indexes
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._sample_size = sample_size
+        self.rows = 0
+        self.skipped = 0
+        self.samples = []
+
+    def read(self, size=8192):
+        for row in self._reader:
+            if not row:
+                continue
+            if len(row) > self._width:
+                self.skipped += 1
+                if len(self.samples) < self._sample_size:
+                    self.samples.append((self._reader.line_num, len(row)))
+                continue
+
+            row += [''] * (self._width - len(row))
+            self._writer.writerow([row[index] for index in self._indexes])
+            self.rows += 1
+            if self._buffer.tell() >= size:
+                break
+
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+class SyncLogger(logging.LoggerAdapter):
+    """Logger of one sync run. A run started with `debug` logs its
+      debug lines at INFO, so they show without lowering the level of
+      the logger that every run of the vendor shares."""
+
+    def __init__(self, logger, debug=False):
+        super().__init__(logger, {})
+        self.verbose = debug
+
+    def process(self, msg, kwargs):
+        # Keep the caller's extra, the adapter adds none
+        return msg, kwargs
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.INFO if self.verbose else logging.DEBUG, msg, *args, **kwargs)
+
+
+class VendorSync():
+    """Ingestion core shared by the vendor syncs. Each vendor adapter
+      subclasses it with its FTP server, its models, its files and the
+      statements merging a file into its tables. Downloads, change
+      detection, COPY staging, the product summaries and the
+      cross-vendor GTIN index all come from here."""
+    _skip_existing = False
+
+    # Short vendor code, used for the local copies and cache keys
+    vendor = None
+
+    # FTP connection info, and the remote directory of the files
+    ftp_host = None
+    ftp_user = None
+    ftp_password = None
+    remote_dir = ''
+
+    # Vendor files in processing order, mapped to the method loading each.
+    # The first is the catalog, the others are loaded whenever it changes
+    feed_files = {}
+    encoding = 'ISO-8859-1'
+
+    # Phases the time of a sync is split into. Download is the time spent
+    # waiting on the network, parse covers reading the files into COPY
+    phases = ['download', 'parse', 'transform', 'write', 'invalidate']
+
+    # Vendor models
+    category_model = None
+    product_model = None
+    variation_model = None
+    summary_model = None
+    feed_model = None
+
+    def __init__(self, download=True, debug=False, suffix=None,
+                 basename=None, detail=None, progress=None, force=False):
+        """Set up a sync run. Progress goes to the `progress` callback
+          and the sync's logger, which shows its debug lines too when
+          `debug` is set."""
+        self._download = download
+        self._force = force
+        self._fingerprints = {}
+        self._processed = {}
+        self._suffix = suffix
+        self._basename = basename
+        self._detail = detail
+        self.logger = SyncLogger(logging.getLogger(self.__module__), debug)
+        self._progress = progress
+        # Rows of the vendor files merged, by outcome
+        self.counts = {'created': 0, 'updated': 0, 'skipped': 0, 'errored': 0}
+        self.status = {'phase': None, 'rows_processed': 0, 'errors': [],
+                       'counts': self.counts}
+        self.files = []
+        self.timings = dict.fromkeys(self.phases, 0.0)
+        self.bytes_downloaded = 0
+        self.statements = 0
+
+    @property
+    def tables(self):
+        """Table names of the vendor models, for formatting SQL."""
+        return {
+            'categories': self.category_model._meta.db_table,
+            'products': self.product_model._meta.db_table,
+            'variations': self.variation_model._meta.db_table,
+            'summaries': self.summary_model._meta.db_table,
+            'index': VendorVariation._meta.db_table,
+        }
+
+    #####################################################
+    #                       Commons                     #
+    #####################################################
+    def ensure_directory(self, directory):
+        """Ensure that the given directory exists."""
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def local_path(self, filename):
+        """Path of the local copy of a vendor file."""
+        return os.path.join('files', self.vendor, filename)
+
+    def is_current(self, recorded, filename, size, modified):
+        """Whether the local copy of a file matches the fingerprint
+          the remote server reports and the last sync `recorded`."""
+        return bool(not self._force and recorded and modified
+                    and os.path.isfile(self.local_path(filename))
+                    and (recorded.size, recorded.modified) == (size, modified))
+
+    def is_reupload(self, recorded, size):
+        """Whether a file may be the one the last sync processed, only
+          uploaded again: a new timestamp but the same size."""
+        return bool(not self._force and recorded and recorded.checksum
+                    and recorded.size == size)
+
+    def record_fingerprint(self, filename, feed):
+        """Note a file read in full and processed. Its fingerprint is
+          saved by save_fingerprints once the tables derived from it are
+          refreshed too."""
+        fingerprint = self._fingerprints.pop(filename, None)
+        if fingerprint and 'checksum' not in fingerprint and getattr(feed, 'complete', False):
+            fingerprint['checksum'] = feed.checksum
+        if fingerprint and fingerprint.get('checksum'):
+            self._processed[filename] = fingerprint
+
+    def save_fingerprints(self):
+        """Save the fingerprints of the processed files, so later syncs
+          skip them while they stay unchanged."""
+        for filename, fingerprint in self._processed.items():
+            self.feed_model.objects.update_or_create(filename=filename, defaults=fingerprint)
+        self._processed = {}
+
+    def ftp_client(self):
+        """Return a client for the vendor FTP server."""
+        return VendorFTPClient(self.ftp_host, self.ftp_user, self.ftp_password)
+
+    def open_feeds(self, client, filenames=None):
+        """Start streaming the vendor files, skipping files unchanged
+          since the last sync. The downloads run in the background
+          while earlier files are processed. Returns a stream for each
+          changed file, keyed by name.
+          Files uploaded again with the same size are downloaded in
+          full first, and skipped too when their checksum shows the
+          content is the one already processed."""
+        self.ensure_directory(os.path.join('files', self.vendor))
+
+        feeds = {}
+        for filename in filenames or self.feed_files:
+            path = self.remote_dir + filename
+            size, modified = client.stat(path)
+            recorded = self.feed_model.objects.filter(filename=filename).first()
+            if self.is_current(recorded, filename, size, modified):
+                self.logger.info("Skipping unchanged file: %s", filename)
+                continue
+
+            self.logger.info("Downloading '%s'", filename)
+            self._fingerprints[filename] = {'size': size, 'modified': modified}
+            if self.is_reupload(recorded, size):
+                local_path = self.local_path(filename)
+                self.bytes_downloaded += client.download(path, local_path)
+                checksum = file_checksum(local_path)
+                if checksum == recorded.checksum:
+                    self.logger.info("Skipping re-uploaded file: %s", filename)
+                    self._fingerprints.pop(filename)
+                    recorded.modified = modified
+                    recorded.save(update_fields=['modified', 'updated_at'])
+                    continue
+                self._fingerprints[filename]['checksum'] = checksum
+                feeds[filename] = open(local_path, 'rb')
+                continue
+
+            feeds[filename] = client.stream(path, self.local_path(filename),
+                                            queue_size=settings.SYNC_QUEUE_SIZE)
+        return feeds
+
+    def process_feed(self, feeds, filename, update):
+        """Run `update` on the stream of a changed file, or on the
+          local copy of an unchanged one, then note the file processed."""
+        feed = feeds.get(filename)
+        if feed is None:
+            file_path = self.local_path(filename)
+            if not os.path.isfile(file_path):
+                self.report(error=f"File {filename} not found.")
+                return
+            feed = open(file_path, 'rb')
+
+        with feed:
+            update(feed)
+        self.record_fingerprint(filename, feed)
+
+    def clean_directory(self, directory):
+        """Clean the given directory by removing all files."""
+        self.logger.debug("Cleaning directory: %s", directory)
+        try:
+            shutil.rmtree(directory)
+            os.makedirs(directory)
+        except Exception:
+            self.logger.exception("Error cleaning directory: %s", directory)
+
+    def report(self, phase=None, rows=0, error=None):
+        """Record sync progress and pass it on to the progress callback."""
+        if phase:
+            self.status['phase'] = phase
+            self.logger.debug("Phase: %s", phase)
+        self.status['rows_processed'] += rows
+        if error:
+            self.status['errors'].append(error)
+            self.logger.warning(error)
+
+        if self._progress:
+            self._progress(self.status)
+
+    def count(self, **counts):
+        """Add to the created, updated, skipped and errored row counts."""
+        for outcome, rows in counts.items():
+            self.counts[outcome] += rows
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the block to a phase of the sync."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - started
+
+    def count_statement(self, execute, sql, params, many, context):
+        """Database execute wrapper counting the statements of a sync.
+          COPY doesn't go through it, load_stage counts its own."""
+        self.statements += 1
+        return execute(sql, params, many, context)
+
+    #####################################################
+    #                   Staging Tables                  #
+    #####################################################
+    def load_stage(self, feed, stage, columns, delimiter=','):
+        """Stream a delimited file into a temporary staging table with
+          COPY. Only the given columns are loaded, as text, and they are
+          cleaned by the merge statements. Returns the columns the file
+          had and the number of rows staged. Malformed lines count as
+          errored. The table is dropped when the surrounding transaction
+          commits."""
+        filename = os.path.basename(feed.name)
+        started = time.perf_counter()
+        waited = getattr(feed, 'wait', 0.0)
+        with io.TextIOWrapper(feed, newline='', encoding=self.encoding) as text_file:
+            reader = csv.reader(text_file, delimiter=delimiter)
+            header = next(reader)
+            indexes = [header.index(name) for name in columns if name in header]
+            staged = [header[index] for index in indexes]
+            quoted = ['"{}"'.format(column) for column in staged]
+            stream = CsvCopyStream(reader, len(header), indexes)
+
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+                cursor.execute(
+                    f"CREATE TEMP TABLE {stage} (_line bigserial, "
+                    f"{', '.join(column + ' text' for column in quoted)}) ON COMMIT DROP"
+                )
+                cursor.copy_expert(
+                    f"COPY {stage} ({', '.join(quoted)}) FROM STDIN WITH (FORMAT csv)",
+                    stream,
+                )
+                # COPY goes around the execute wrapper counting statements
+                self.statements += 1
+                cursor.execute(f"ANALYZE {stage}")
+
+        # Local copies have no network wait, their load is all parsing
+        download = getattr(feed, 'wait', 0.0) - waited
+        self.timings['download'] += download
+        self.timings['parse'] += time.perf_counter() - started - download
+        if stream.skipped:
+            self.count(errored=stream.skipped)
+            self.report(error=f"Skipped {stream.skipped} malformed lines in {filename}.")
+            for line, fields in stream.samples:
+                self.logger.debug("Malformed line %d of %s: %d fields, %d expected",
+                                  line, filename, fields, len(header))
+        self.logger.debug("Staged %d rows from %s.", stream.rows, filename)
+        self.report(rows=stream.rows)
+        return staged, stream.rows
+
+    def execute_stage_sql(self, sql, stage, **params):
+        """Run a merge statement against a staging table and return
+          the number of rows it touched."""
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(stage=stage, **self.tables, **params))
+            return cursor.rowcount
+
+    def execute_merge_sql(self, sql, stage, **params):
+        """Run an INSERT ... ON CONFLICT merge against a staging table
+          and return the number of rows it created and updated."""
+        merge = sql.format(stage=stage, **self.tables, **params)
+        with connection.cursor() as cursor:
+            cursor.execute(MERGE_COUNTS_SQL.format(merge=merge))
+            return cursor.fetchone()
+
+    def deduplicate_stage(self, stage, key, keep='last'):
+        """Keep only the first or last line of the file for each key."""
+        return self.execute_stage_sql(DEDUPLICATE_STAGE_SQL, stage, key=f'"{key}"',
+                                      comparison='<' if keep == 'last' else '>')
+
+    def conflict_action(self, table, catalog_fields, fields=()):
+        """ON CONFLICT action on one of the vendor `tables`, like
+          'products', updating the given fields, plus the catalog fields
+          unless existing rows are skipped. Rows whose values are
+          unchanged are not rewritten."""
+        if not self._skip_existing:
+            fields = [*catalog_fields, *fields]
+        if not fields:
+            return 'DO NOTHING'
+        return 'DO UPDATE SET {} WHERE ({}) IS DISTINCT FROM ({})'.format(
+            ', '.join(f"{field} = EXCLUDED.{field}" for field in [*fields, 'updated_at']),
+            ', '.join(f"{self.tables[table]}.{field}" for field in fields),
+            ', '.join(f"EXCLUDED.{field}" for field in fields),
+        )
+
+    #####################################################
+    #                 Product Summaries                 #
+    #####################################################
+    def refresh_summaries(self):
+        """Recompute the listing summary of every product from its
+          variations, then the counts of every category, rewriting only
+          the rows that changed."""
+        self.report(phase='refresh summaries')
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(DELETE_STALE_SUMMARIES_SQL.format(**self.tables))
+            cursor.execute(REFRESH_SUMMARIES_SQL.format(**self.tables))
+            refreshed = cursor.rowcount
+            cursor.execute(REFRESH_CATEGORIES_SQL.format(**self.tables))
+            categories = cursor.rowcount
+
+        self.logger.debug("Refreshed %d product summaries and %d categories.",
+                          refreshed, categories)
+
+    def refresh_search_vectors(self):
+        """Recompute the search vector of every product, rewriting
+          only the vectors that changed."""
+        self.report(phase='refresh search')
+        with connection.cursor() as cursor:
+            cursor.execute(UPDATE_SEARCH_VECTORS_SQL.format(**self.tables))
+            refreshed = cursor.rowcount
+
+        self.logger.debug("Refreshed search vectors of %d products.", refreshed)
+
+    def refresh_gtin_index(self):
+        """Copy the vendor's variations to the cross-vendor GTIN index,
+          rewriting only the entries that changed."""
+        self.report(phase='refresh gtin index')
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(DELETE_STALE_GTIN_INDEX_SQL.format(**self.tables), [self.vendor])
+            cursor.execute(REFRESH_GTIN_INDEX_SQL.format(**self.tables), [self.vendor])
+            refreshed = cursor.rowcount
+
+        self.logger.debug("Refreshed %d GTIN index entries.", refreshed)
+
+    #####################################################
+    #                   Update Handler                  #
+    #####################################################
+    def sync_files(self):
+        """Stream the vendor files, merge them into the catalog and
+          refresh what is derived from it. Files unchanged since the
+          last sync are skipped, the others are loaded while the next
+          ones download in the background."""
+        with self.ftp_client() as client:
+            self.report(phase='download files')
+            with self.phase('download'):
+                feeds = self.open_feeds(client)
+            self.files = sorted(feeds)
+            try:
+                catalog = next(iter(self.feed_files), None) in feeds
+                for filename, update in self.feed_files.items():
+                    # New variations need the other files even if those didn't change
+                    if filename in feeds or catalog:
+                        self.process_feed(feeds, filename, getattr(self, update))
+            finally:
+                for feed in feeds.values():
+                    feed.close()
+                    # Downloaded in full by open_feeds when not streamed
+                    self.bytes_downloaded += getattr(feed, 'size', 0)
+
+        if feeds:
+            with self.phase('write'):
+                self.refresh_summaries()
+                self.refresh_search_vectors()
+                self.refresh_gtin_index()
+            # Cached API responses are stale once the new catalog is visible
+            transaction.on_commit(self.invalidate_caches)
+            # A file counts as synced only once everything derived from it
+            # is, a failed refresh leaves it to be loaded again next time
+            self.save_fingerprints()
+
+    def invalidate_caches(self):
+        """Move the vendor's views and the cross-vendor ones to a new
+          catalog version."""
+        with self.phase('invalidate'):
+            bump_catalog_version(self.vendor)
+            bump_catalog_version('catalog')
+
+    def finish(self, run, state, started, error=None):
+        """Save the timings and counts of the sync to its SyncRun and
+          the worker metrics, and log them as one summary record."""
+        run.state = state
+        run.finished_at = timezone.now()
+        run.files = self.files
+        run.seconds = round(time.monotonic() - started, 3)
+        run.phases = {phase: round(seconds, 3) for phase, seconds in self.timings.items()}
+        run.bytes_downloaded = self.bytes_downloaded
+        run.rows_processed = self.status['rows_processed']
+        run.rows_created = self.counts['created']
+        run.rows_updated = self.counts['updated']
+        run.rows_skipped = self.counts['skipped']
+        run.rows_errored = self.counts['errored']
+        run.statements = self.statements
+        run.errors = self.status['errors'] + ([error] if error else [])
+        run.save()
+        record_sync(run)
+
+        summary = {'vendor': self.vendor, 'state': state, 'files': run.files,
+                   'seconds': run.seconds, 'phases': run.phases,
+                   'bytes': run.bytes_downloaded, 'rows': run.rows_processed,
+                   **self.counts, 'rows_per_second': round(run.rows_per_second),
+                   'statements': run.statements, 'errors': len(run.errors)}
+        self.logger.log(logging.INFO if state == SyncRun.FINISHED else logging.ERROR,
+                        "Sync %s: %s", state, json.dumps(summary), extra={'sync': summary})
+
+    def handle(self):
+        """Run the sync, recording it in the SyncRun history and the
+          worker metrics whether it finishes or fails."""
+        run = SyncRun.objects.create(vendor=self.vendor)
+        started = time.monotonic()
+        try:
+            with connection.execute_wrapper(self.count_statement):
+                self.sync_files()
+        except Exception as e:
+            self.finish(run, SyncRun.FAILED, started, error=str(e))
+            raise
+
+        self.report(phase='finished')
+        self.finish(run, SyncRun.FINISHED, started)
+        return True
@@ -0,0 +1,84 @@
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+from .models import SyncRun
+
+
+#####################################################
+#                   Worker Metrics                  #
+#####################################################
+# Recorded by the process running the sync, the Celery worker
+SYNC_RUNS = Counter('vendor_sync_runs', 'Vendor syncs run, by final state.',
+                    ['vendor', 'state'])
+SYNC_PHASE_SECONDS = Histogram('vendor_sync_phase_seconds', 'Time spent in each phase of a sync.',
+                               ['vendor', 'phase'],
+                               buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+SYNC_DOWNLOADED_BYTES = Counter('vendor_sync_downloaded_bytes',
+                                'Bytes of vendor files downloaded.', ['vendor'])
+SYNC_ROWS = Counter('vendor_sync_rows', 'Rows of vendor files processed, by outcome.',
+                    ['vendor', 'outcome'])
+SYNC_STATEMENTS = Counter('vendor_sync_db_statements', 'Database statements run by syncs.',
+                          ['vendor'])
+
+
+def record_sync(run):
+    """Add a finished SyncRun to the worker metrics."""
+    SYNC_RUNS.labels(run.vendor, run.state).inc()
+    for phase, seconds in run.phases.items():
+        SYNC_PHASE_SECONDS.labels(run.vendor, phase).observe(seconds)
+    SYNC_PHASE_SECONDS.labels(run.vendor, 'total').observe(run.seconds)
+    SYNC_DOWNLOADED_BYTES.labels(run.vendor).inc(run.bytes_downloaded)
+    for outcome in ('created', 'updated', 'skipped', 'errored'):
+        SYNC_ROWS.labels(run.vendor, outcome).inc(getattr(run, f'rows_{outcome}'))
+    SYNC_STATEMENTS.labels(run.vendor).inc(run.statements)
+
+
+#####################################################
+#                   History Metrics                 #
+#####################################################
+class SyncRunCollector():
+    """Gauges of the last finished run of each vendor, read from the
+      SyncRun history on every scrape. The web process reports syncs
+      this way, though they run in the workers."""
+
+    def collect(self):
+        runs = (SyncRun.objects.exclude(state=SyncRun.RUNNING)
+                .order_by('vendor', '-started_at').distinct('vendor'))
+        labels = ['vendor']
+        finished = GaugeMetricFamily('vendor_sync_last_run_timestamp_seconds',
+                                     'When the last sync finished.', labels=labels)
+        success = GaugeMetricFamily('vendor_sync_last_run_success',
+                                    'Whether the last sync finished without failing.',
+                                    labels=labels)
+        seconds = GaugeMetricFamily('vendor_sync_last_run_seconds',
+                                    'Time taken by each phase of the last sync.',
+                                    labels=['vendor', 'phase'])
+        downloaded = GaugeMetricFamily('vendor_sync_last_run_downloaded_bytes',
+                                       'Bytes downloaded by the last sync.', labels=labels)
+        rows = GaugeMetricFamily('vendor_sync_last_run_rows',
+                                 'Rows processed by the last sync, by outcome.',
+                                 labels=['vendor', 'outcome'])
+        throughput = GaugeMetricFamily('vendor_sync_last_run_rows_per_second',
+                                       'Rows processed per second by the last sync.',
+                                       labels=labels)
+        statements = GaugeMetricFamily('vendor_sync_last_run_db_statements',
+                                       'Database statements run by the last sync.',
+                                       labels=labels)
+
+        for run in runs:
+            finished.add_metric([run.vendor], run.finished_at.timestamp())
+            success.add_metric([run.vendor], run.state == SyncRun.FINISHED)
+            for phase, phase_seconds in run.phases.items():
+                seconds.add_metric([run.vendor, phase], phase_seconds)
+            seconds.add_metric([run.vendor, 'total'], run.seconds)
+            downloaded.add_metric([run.vendor], run.bytes_downloaded)
+            for outcome in ('created', 'updated', 'skipped', 'errored'):
+                rows.add_metric([run.vendor, outcome], getattr(run, f'rows_{outcome}'))
+            throughput.add_metric([run.vendor], run.rows_per_second)
+            statements.add_metric([run.vendor], run.statements)
+
+        return [finished, success, seconds, downloaded, rows, throughput, statements]
+
+
+history_registry = CollectorRegistry(auto_describe=False)
+history_registry.register(SyncRunCollector())
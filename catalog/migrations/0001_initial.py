@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+# Variations of both vendors already loaded, later syncs keep them current
+FILL_INDEX_SQL = """
+    INSERT INTO catalog_vendorvariation (vendor, item_number, gtin, product_number,
+                                         brand_name, color_name, size, quantity,
+                                         price_per_piece, price_per_dozen,
+                                         price_per_case, retail_price, updated_at)
+    SELECT '{vendor}', v.item_number, v.gtin, p.product_number, p.brand_name,
+           v.color_name, v.size, v.quantity, v.price_per_piece, v.price_per_dozen,
+           v.price_per_case, v.retail_price, now()
+    FROM {app}_variations v
+    JOIN {app}_products p ON p.product_id = v.product_number_id
+    WHERE v.gtin <> ''
+"""
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('alphabroder', '0008_remove_variation_hashes'),
+        ('sanmar', '0008_category_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorVariation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vendor', models.CharField(choices=[('alpb', 'Alphabroder'), ('snmr', 'SanMar')], max_length=10)),
+                ('item_number', models.CharField(max_length=255)),
+                ('gtin', models.CharField(max_length=255)),
+                ('product_number', models.CharField(max_length=255)),
+                ('brand_name', models.CharField(max_length=255)),
+                ('color_name', models.CharField(max_length=255)),
+                ('size', models.CharField(max_length=255)),
+                ('quantity', models.IntegerField(null=True)),
+                ('price_per_piece', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('price_per_dozen', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('price_per_case', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('retail_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Vendor Variation',
+                'verbose_name_plural': 'Vendor Variations',
+                'indexes': [models.Index(fields=['gtin'], name='catalog_gtin_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='vendorvariation',
+            constraint=models.UniqueConstraint(fields=('vendor', 'item_number'), name='catalog_vendor_item_unique'),
+        ),
+        migrations.RunSQL(FILL_INDEX_SQL.format(vendor='alpb', app='alphabroder'),
+                          reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(FILL_INDEX_SQL.format(vendor='snmr', app='sanmar'),
+                          reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vendorvariation',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['gtin', 'price_per_piece'], name='catalog_gtin_in_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_gtin_in_stock_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vendor', models.CharField(choices=[('alpb', 'Alphabroder'), ('snmr', 'SanMar')], max_length=10)),
+                ('state', models.CharField(choices=[('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('files', models.JSONField(default=list)),
+                ('seconds', models.FloatField(default=0)),
+                ('phases', models.JSONField(default=dict)),
+                ('bytes_downloaded', models.BigIntegerField(default=0)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_created', models.IntegerField(default=0)),
+                ('rows_updated', models.IntegerField(default=0)),
+                ('rows_skipped', models.IntegerField(default=0)),
+                ('rows_errored', models.IntegerField(default=0)),
+                ('statements', models.IntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Sync Run',
+                'verbose_name_plural': 'Sync Runs',
+                'indexes': [models.Index(fields=['vendor', '-started_at'], name='catalog_syncrun_vendor_idx')],
+            },
+        ),
+    ]
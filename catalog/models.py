@@ -0,0 +1,98 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+VENDORS = [
+    ('alpb', 'Alphabroder'),
+    ('snmr', 'SanMar'),
+]
+
+
+class VendorVariation(models.Model):
+    """A variation of any vendor, copied from the vendor's own tables
+      by its sync, so a GTIN can be looked up across vendors at once."""
+    vendor = models.CharField(max_length=10, choices=VENDORS)
+    item_number = models.CharField(max_length=255)
+    gtin = models.CharField(max_length=255)
+
+    # Product details
+    product_number = models.CharField(max_length=255)
+    brand_name = models.CharField(max_length=255)
+    color_name = models.CharField(max_length=255)
+    size = models.CharField(max_length=255)
+
+    # Inventory and pricing
+    quantity = models.IntegerField(null=True)
+    price_per_piece = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    price_per_dozen = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    price_per_case = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    retail_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Vendor Variation")
+        verbose_name_plural = _("Vendor Variations")
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'item_number'],
+                                    name='catalog_vendor_item_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['gtin'], name='catalog_gtin_idx'),
+            # Cheapest in-stock offer of a GTIN
+            models.Index(fields=['gtin', 'price_per_piece'], condition=models.Q(quantity__gt=0),
+                         name='catalog_gtin_in_stock_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.vendor} {self.item_number}'
+
+
+class SyncRun(models.Model):
+    """History of the vendor syncs, one row per run, with the time
+      each phase took and what the run downloaded and wrote."""
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    STATES = [
+        (RUNNING, 'Running'),
+        (FINISHED, 'Finished'),
+        (FAILED, 'Failed'),
+    ]
+
+    vendor = models.CharField(max_length=10, choices=VENDORS)
+    state = models.CharField(max_length=10, choices=STATES, default=RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+    files = models.JSONField(default=list)
+
+    # Seconds taken overall and by each phase
+    seconds = models.FloatField(default=0)
+    phases = models.JSONField(default=dict)
+
+    # Volume of the run
+    bytes_downloaded = models.BigIntegerField(default=0)
+    rows_processed = models.IntegerField(default=0)
+    rows_created = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_skipped = models.IntegerField(default=0)
+    rows_errored = models.IntegerField(default=0)
+    statements = models.IntegerField(default=0)
+    errors = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = _("Sync Run")
+        verbose_name_plural = _("Sync Runs")
+        indexes = [
+            models.Index(fields=['vendor', '-started_at'], name='catalog_syncrun_vendor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.vendor} {self.started_at:%Y-%m-%d %H:%M} {self.state}'
+
+    @property
+    def rows_changed(self):
+        return self.rows_created + self.rows_updated
+
+    @property
+    def rows_per_second(self):
+        return self.rows_processed / self.seconds if self.seconds else 0.0
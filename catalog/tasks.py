@@ -0,0 +1,55 @@
+import uuid
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+
+
+class SyncAlreadyRunning(Exception):
+    """Raised by a sync job started while another job syncs the vendor."""
+
+
+def sync_lock_key(vendor):
+    """Cache key holding the id of the job syncing a vendor."""
+    return f'sync:{vendor}:job'
+
+
+def queue_sync(task, vendor, force=False):
+    """Queue a sync of the vendor unless a job is queued or running for
+      it already. Returns the id of the job doing the sync and whether
+      it was queued by this call."""
+    key = sync_lock_key(vendor)
+    job_id = str(uuid.uuid4())
+    if not cache.add(key, job_id, settings.SYNC_LOCK_SECONDS):
+        running = cache.get(key)
+        if running and not AsyncResult(running, app=task.app).ready():
+            return running, False
+        # The job holding the lock ended without releasing it
+        cache.set(key, job_id, settings.SYNC_LOCK_SECONDS)
+
+    task.apply_async(kwargs={'force': force}, task_id=job_id)
+    return job_id, True
+
+
+def run_sync(task, sync_class, force=False):
+    """Run a vendor sync from a Celery task, publishing its progress
+      (phase, rows processed, errors) to the result backend. Only one
+      job syncs a vendor at a time, they share the local copies of its
+      files and its fingerprints. A job queued while another runs fails
+      with SyncAlreadyRunning."""
+    key = sync_lock_key(sync_class.vendor)
+    job_id = task.request.id
+    # Jobs queued by queue_sync hold the lock already, others take it here
+    if not cache.add(key, job_id, settings.SYNC_LOCK_SECONDS) and cache.get(key) != job_id:
+        raise SyncAlreadyRunning(f"Job {cache.get(key)} is syncing {sync_class.vendor} already.")
+
+    def progress(status):
+        task.update_state(state='PROGRESS', meta=status)
+
+    try:
+        process = sync_class(progress=progress, force=force)
+        process.handle()
+        return process.status
+    finally:
+        if cache.get(key) == job_id:
+            cache.delete(key)
@@ -0,0 +1,157 @@
+import logging
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api.testing import CatalogTestCase
+
+from .ingest import VendorSync
+from .tasks import SyncAlreadyRunning, queue_sync, run_sync, sync_lock_key
+from .views import history_cache
+from .models import SyncRun, VendorVariation
+
+
+class GtinComparisonTests(CatalogTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        offers = [
+            ('alpb', 'B1', '190000000001', 10, '2.79'),
+            ('snmr', 'S1', '190000000001', 5, '2.50'),
+            ('alpb', 'B2', '190000000002', 10, '3.00'),
+            ('snmr', 'S2', '190000000002', 0, '1.00'),  # Out of stock
+            ('snmr', 'S3', '190000000003', 0, '1.00'),
+        ]
+        for vendor, item_number, gtin, quantity, price in offers:
+            VendorVariation.objects.create(
+                vendor=vendor, item_number=item_number, gtin=gtin,
+                product_number='5000', brand_name='Gildan', color_name='Black',
+                size='M', quantity=quantity, price_per_piece=price,
+            )
+
+    def compare(self, gtins):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('catalog:gtin-comparison'), {'gtins': gtins})
+        self.assertEqual(response.status_code, 200)
+        return {row['gtin']: row['cheapest'] for row in response.json()}
+
+    def test_cheapest_in_stock_vendor(self):
+        cheapest = self.compare('190000000001,190000000002')
+
+        self.assertEqual((cheapest['190000000001']['vendor'],
+                          cheapest['190000000001']['price_per_piece']), ('snmr', '2.50'))
+        self.assertEqual(cheapest['190000000002']['item_number'], 'B2')
+
+    def test_gtins_without_stock_are_null(self):
+        cheapest = self.compare('190000000003,unknown')
+
+        self.assertEqual(cheapest, {'190000000003': None, 'unknown': None})
+
+    def test_padded_gtins_match(self):
+        cheapest = self.compare('00190000000001')
+
+        self.assertEqual(cheapest['00190000000001']['vendor'], 'snmr')
+
+    def test_numbers_longer_than_a_gtin_are_passed_through(self):
+        long_gtins = ['1' * 29, '1.9E+40', '9' * 5000]
+        cheapest = self.compare(','.join(long_gtins))
+
+        self.assertEqual(cheapest, dict.fromkeys(long_gtins))
+
+
+@override_settings(METRICS_TOKEN='secret')
+class SyncMetricsTests(TestCase):
+
+    def setUp(self):
+        history_cache.clear()
+
+    def scrape(self, token='secret'):
+        return self.client.get(reverse('catalog:metrics'), HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_last_finished_run_of_each_vendor(self):
+        finished = {'state': SyncRun.FINISHED, 'finished_at': timezone.now()}
+        SyncRun.objects.create(vendor='alpb', rows_processed=10, seconds=5, **finished)
+        SyncRun.objects.create(vendor='alpb', rows_processed=300, seconds=2,
+                               phases={'download': 0.5, 'write': 1.5}, **finished)
+        SyncRun.objects.create(vendor='alpb')  # Still running
+        SyncRun.objects.create(vendor='snmr', state=SyncRun.FAILED, finished_at=timezone.now())
+
+        response = self.scrape()
+
+        self.assertEqual(response.status_code, 200)
+        metrics = response.content.decode()
+        self.assertIn('vendor_sync_last_run_rows_per_second{vendor="alpb"} 150.0', metrics)
+        self.assertIn('vendor_sync_last_run_seconds{phase="write",vendor="alpb"} 1.5', metrics)
+        self.assertIn('vendor_sync_last_run_success{vendor="alpb"} 1.0', metrics)
+        self.assertIn('vendor_sync_last_run_success{vendor="snmr"} 0.0', metrics)
+
+    def test_history_is_read_once_per_cache_period(self):
+        self.scrape()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scrape().status_code, 200)
+
+    def test_scrapers_need_the_token(self):
+        self.assertEqual(self.scrape(token='wrong').status_code, 403)
+        self.assertEqual(self.client.get(reverse('catalog:metrics')).status_code, 403)
+
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.scrape(token='').status_code, 404)
+
+
+class SyncLoggerTests(SimpleTestCase):
+
+    def test_debug_run_leaves_the_shared_logger_level_alone(self):
+        logger = logging.getLogger(VendorSync.__module__)
+        level = logger.level
+        verbose = VendorSync(debug=True)
+        quiet = VendorSync()
+        self.assertEqual(logger.level, level)
+
+        with self.assertLogs(logger, 'INFO') as logs:
+            verbose.report(phase='download files')
+            quiet.report(phase='parse files')
+            quiet.logger.info("Done")
+        self.assertEqual(logs.output, ['INFO:catalog.ingest:Phase: download files',
+                                       'INFO:catalog.ingest:Done'])
+
+
+class SyncJobTests(CatalogTestCase):
+    catalog_styles = 0
+
+    def setUp(self):
+        super().setUp()
+        self.task = mock.Mock()
+        self.task.request.id = 'job-1'
+        self.sync_class = mock.Mock(vendor='alpb')
+        self.sync_class.return_value.status = {'phase': 'finished'}
+
+    def test_sync_is_queued_once_while_its_job_runs(self):
+        with mock.patch('catalog.tasks.AsyncResult') as result:
+            result.return_value.ready.return_value = False
+            job_id, queued = queue_sync(self.task, 'alpb')
+            self.assertEqual(queue_sync(self.task, 'alpb', force=True), (job_id, False))
+
+            result.return_value.ready.return_value = True
+            other_id, queued_again = queue_sync(self.task, 'alpb')
+
+        self.assertTrue(queued and queued_again)
+        self.assertNotEqual(other_id, job_id)
+        self.assertEqual(self.task.apply_async.call_count, 2)
+
+    def test_job_releases_the_vendor_when_done(self):
+        cache.set(sync_lock_key('alpb'), 'job-1')
+
+        self.assertEqual(run_sync(self.task, self.sync_class), {'phase': 'finished'})
+        self.sync_class.return_value.handle.assert_called_once_with()
+        self.assertIsNone(cache.get(sync_lock_key('alpb')))
+
+    def test_job_fails_while_another_syncs_the_vendor(self):
+        cache.set(sync_lock_key('alpb'), 'job-0')
+
+        with self.assertRaises(SyncAlreadyRunning):
+            run_sync(self.task, self.sync_class)
+        self.sync_class.assert_not_called()
+        self.assertEqual(cache.get(sync_lock_key('alpb')), 'job-0')
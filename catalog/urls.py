@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import GtinComparisonView, metrics
+
+app_name = 'catalog'
+
+urlpatterns = [
+    path('gtins/', GtinComparisonView.as_view(), name='gtin-comparison'),
+    path('metrics/', metrics, name='metrics'),
+]
\ No newline at end of file
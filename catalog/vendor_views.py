@@ -0,0 +1,331 @@
+from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework import filters
+from django.http import Http404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from celery.result import AsyncResult
+from django.conf import settings
+from api.caching import TTLCache, cache_catalog, catalog_version, condition_catalog
+from api.export import EXPORT_FORMATS, export_response
+from api.profiling import ProfiledViewMixin
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Case, F, FloatField, Q, Value, When
+from .ingest import normalize_gtin
+from .tasks import queue_sync
+
+
+#####################################################
+#                   Helper Classes                  #
+#####################################################
+# pagination
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ProductCursorPagination(CursorPagination):
+    """Keyset pagination over product ids, for crawling the whole
+      catalog. Every page costs the same and no count is run."""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'product_id'
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """Full text search over style number, brand, descriptions and
+      colors, ranked by relevance. Partial style numbers still match,
+      through a trigram index."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+
+        query = SearchQuery(terms, config='english', search_type='websearch')
+        # Style number matches rank above text matches
+        style_rank = Case(
+            When(product_number__iexact=terms, then=Value(1.0)),
+            When(product_number__istartswith=terms, then=Value(0.5)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return (
+            queryset
+            .filter(Q(search_vector=query) | Q(product_number__icontains=terms))
+            .annotate(rank=SearchRank(F('search_vector'), query) + style_rank)
+            .order_by('-rank', *queryset.query.order_by)
+        )
+
+
+# categories of every vendor, by vendor and catalog version
+categories_cache = TTLCache(ttl=settings.CATEGORY_CACHE_SECONDS)
+
+
+class VendorViewMixin():
+    """Views shared by the vendor apps. Each app subclasses them with
+      its vendor code, its models and its serializers. Responses can
+      carry ETags (`conditional`) and be cached (`cached`) by the
+      vendor's catalog version, the way the app views used to be
+      decorated."""
+
+    # Short vendor code, the one of the vendor sync
+    vendor = None
+
+    # Vendor models
+    category_model = None
+    product_model = None
+    variation_model = None
+
+    conditional = False
+    cached = False
+
+    def dispatch(self, request, *args, **kwargs):
+        view = super().dispatch
+        if self.cached:
+            view = cache_catalog(self.vendor)(view)
+        if self.conditional:
+            view = condition_catalog(self.vendor)(view)
+        return view(request, *args, **kwargs)
+
+    def get_categories(self):
+        """All categories with their counts, cached in process for the
+          current catalog version, so a sync is picked up right away."""
+        return categories_cache.get_or_set((self.vendor, catalog_version(self.vendor)),
+                                           lambda: list(self.category_model.objects.all()))
+
+    def find_category(self, name):
+        """Return the category named `name`, ignoring case, or None."""
+        name = name.upper()
+        return next((category for category in self.get_categories()
+                     if category.category.upper() == name), None)
+
+
+#####################################################
+#                 Updatedata Class                  #
+#####################################################
+class UpdateDataView(VendorViewMixin, APIView):
+    # Celery task running the vendor sync
+    sync_task = None
+
+    def get(self, request, *args, **kwargs):
+        """Queue a sync, or point to the job already syncing the vendor."""
+        force = request.query_params.get('force', '').lower() in ('1', 'true')
+        job_id, queued = queue_sync(self.sync_task, self.vendor, force=force)
+        return Response({"job_id": job_id,
+                         "status_url": request.build_absolute_uri(job_id + '/')},
+                        status=status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK)
+
+
+class UpdateStatusView(VendorViewMixin, APIView):
+    sync_task = None
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = AsyncResult(job_id, app=self.sync_task.app)
+        progress = job.info if isinstance(job.info, dict) else {}
+        errors = progress.get('errors', [])
+        if job.failed():
+            errors = errors + [str(job.result)]
+
+        return Response({"job_id": job_id,
+                         "state": job.state,
+                         "phase": progress.get('phase'),
+                         "rows_processed": progress.get('rows_processed', 0),
+                         "counts": progress.get('counts', {}),
+                         "errors": errors},
+                        status=status.HTTP_200_OK)
+
+
+#####################################################
+#                   API Controllers                 #
+#####################################################
+class ProductsListView(VendorViewMixin, ProfiledViewMixin, ListAPIView):
+    conditional = cached = True
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [ProductSearchFilter]
+
+    # Leave out products without a price range
+    priced_only = False
+
+    @property
+    def paginator(self):
+        """Page numbers by default, cursors with `?pagination=cursor`."""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = ProductCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        category_param = self.request.query_params.get('category', None)
+
+        if category_param:
+            category = self.find_category(category_param)
+            if category is None:
+                raise Http404("Category does not exist")
+
+            # Filter styles by category
+            products = self.product_model.objects.filter(category=category)
+        else:
+            products = self.product_model.objects.all()
+
+        # Front image and price range for the serializer, kept by the sync
+        return products.order_by('-created_at', '-product_id').annotate(
+            front_image=F('summary__front_image'),
+            min_price=F('summary__min_price'),
+            max_price=F('summary__max_price'),
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())  # Apply search filter
+
+        if self.priced_only:
+            # Exclude products with null price ranges
+            queryset = queryset.exclude(min_price=None, max_price=None)
+
+        # Paginate the queryset
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_404_NOT_FOUND if not queryset.exists() else status.HTTP_200_OK)
+
+
+class CategoryListView(VendorViewMixin, ProfiledViewMixin, ListAPIView):
+    conditional = cached = True
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        return self.get_categories()
+
+
+class VerboseProductsView(VendorViewMixin, ProfiledViewMixin, RetrieveAPIView):
+    conditional = cached = True
+    lookup_field = 'product_number'
+
+    def get_queryset(self):
+        return self.product_model.objects.all()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['product_number'] = self.kwargs['product_number']
+        return context
+
+    def get_object(self):
+        product_number = self.kwargs['product_number']
+        return self.product_model.objects.get(product_number=product_number)
+
+
+class BatchProductsView(VendorViewMixin, ProfiledViewMixin, ListAPIView):
+    """Details and variations of several products in one request,
+      `?product_numbers=A,B,C`. Products are returned in the order
+      asked for, unknown product numbers are left out."""
+    conditional = cached = True
+    pagination_class = None
+    max_products = 100
+
+    def get_product_numbers(self):
+        param = self.request.query_params.get('product_numbers', '')
+        product_numbers = list(dict.fromkeys(
+            product_number.strip() for product_number in param.split(',') if product_number.strip()
+        ))
+
+        if not product_numbers:
+            raise ValidationError({'product_numbers': 'Provide a comma separated list of product numbers.'})
+        if len(product_numbers) > self.max_products:
+            raise ValidationError({'product_numbers': f'At most {self.max_products} product numbers per request.'})
+        return product_numbers
+
+    def list(self, request, *args, **kwargs):
+        product_numbers = self.get_product_numbers()
+        products = {
+            product.product_number: product
+            for product in self.product_model.objects.filter(product_number__in=product_numbers)
+            .prefetch_related('variations')
+        }
+
+        serializer = self.get_serializer(
+            [products[product_number] for product_number in product_numbers
+             if product_number in products],
+            many=True,
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class StockView(VendorViewMixin, ProfiledViewMixin, APIView):
+    """Stock and prices of variations looked up by item number or GTIN,
+      `?item_numbers=A,B` and/or `?gtins=C,D`. GTINs match with or
+      without leading zeros."""
+    conditional = cached = True
+    max_items = 500
+    fields = ['item_number', 'gtin', 'quantity', 'price_per_piece',
+              'price_per_dozen', 'price_per_case', 'retail_price']
+    price_fields = ['price_per_piece', 'price_per_dozen', 'price_per_case', 'retail_price']
+
+    def get_list_param(self, name):
+        param = self.request.query_params.get(name, '')
+        return list(dict.fromkeys(value.strip() for value in param.split(',') if value.strip()))
+
+    def get(self, request, *args, **kwargs):
+        item_numbers = self.get_list_param('item_numbers')
+        gtins = self.get_list_param('gtins')
+
+        if not item_numbers and not gtins:
+            raise ValidationError({'item_numbers': 'Provide a comma separated list of item numbers or GTINs.'})
+        if len(item_numbers) + len(gtins) > self.max_items:
+            raise ValidationError({'item_numbers': f'At most {self.max_items} item numbers and GTINs per request.'})
+
+        variations = (
+            self.variation_model.objects
+            .filter(Q(item_number__in=item_numbers)
+                    | Q(gtin__in={normalize_gtin(gtin) for gtin in gtins}))
+            .order_by('item_number')
+            .values(*self.fields)
+        )
+        # Prices as strings, the way the other endpoints render them
+        stock = [
+            {**variation, **{field: None if variation[field] is None else str(variation[field])
+                            for field in self.price_fields}}
+            for variation in variations
+        ]
+        return Response(stock, status=status.HTTP_200_OK)
+
+
+class ExportView(VendorViewMixin, APIView):
+    """The whole catalog, one row per variation with its product, as
+      `?output=ndjson` (default) or `?output=csv`, gzipped with
+      `?compress=gzip`. Rows are streamed from a server side cursor, so
+      the response is never held in memory."""
+    conditional = True
+    product_columns = {
+        'product_number': 'product_number__product_number',
+        'brand_name': 'product_number__brand_name',
+        'short_description': 'product_number__short_description',
+        'category': 'product_number__category_id',
+    }
+    # Variation fields of the vendor, in export order
+    variation_columns = []
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': f'Choose one of {", ".join(EXPORT_FORMATS)}.'})
+        compress = request.query_params.get('compress') == 'gzip'
+
+        fields = list(self.product_columns) + self.variation_columns
+        rows = (
+            self.variation_model.objects
+            .order_by('product_number_id', 'created_at')  # Variations grouped by product
+            .values_list(*self.product_columns.values(), *self.variation_columns)
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        )
+        return export_response(fields, rows, export_format, compress,
+                               filename=f'{self.vendor}-catalog')
@@ -0,0 +1,84 @@
+import hmac
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.decorators import method_decorator
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from api.caching import TTLCache, cache_catalog, condition_catalog
+from api.profiling import ProfiledViewMixin
+from .ingest import normalize_gtin
+from .metrics import history_registry
+from .models import VendorVariation
+
+
+#####################################################
+#                   API Controllers                 #
+#####################################################
+@method_decorator([condition_catalog('catalog'), cache_catalog('catalog')], name='dispatch')
+class GtinComparisonView(ProfiledViewMixin, APIView):
+    """Cheapest in-stock vendor of each GTIN, `?gtins=A,B`, by piece
+      price. GTINs no vendor has in stock get `"cheapest": null`."""
+    max_gtins = 500
+    fields = ['vendor', 'item_number', 'product_number', 'brand_name', 'quantity',
+              'price_per_piece', 'price_per_dozen', 'price_per_case', 'retail_price']
+    price_fields = ['price_per_piece', 'price_per_dozen', 'price_per_case', 'retail_price']
+
+    def get_gtins(self):
+        param = self.request.query_params.get('gtins', '')
+        gtins = list(dict.fromkeys(gtin.strip() for gtin in param.split(',') if gtin.strip()))
+
+        if not gtins:
+            raise ValidationError({'gtins': 'Provide a comma separated list of GTINs.'})
+        if len(gtins) > self.max_gtins:
+            raise ValidationError({'gtins': f'At most {self.max_gtins} GTINs per request.'})
+        return gtins
+
+    def get(self, request, *args, **kwargs):
+        gtins = self.get_gtins()
+
+        # One row per GTIN, the lowest piece price first
+        offers = (
+            VendorVariation.objects
+            .filter(gtin__in={normalize_gtin(gtin) for gtin in gtins},
+                    quantity__gt=0, price_per_piece__isnull=False)
+            .order_by('gtin', 'price_per_piece', '-quantity')
+            .distinct('gtin')
+            .values('gtin', *self.fields)
+        )
+        cheapest = {
+            offer.pop('gtin'): {**offer, **{field: None if offer[field] is None else str(offer[field])
+                                            for field in self.price_fields}}
+            for offer in offers
+        }
+
+        comparison = [
+            {'gtin': gtin, 'cheapest': cheapest.get(normalize_gtin(gtin))}
+            for gtin in gtins
+        ]
+        return Response(comparison, status=status.HTTP_200_OK)
+
+
+
+#####################################################
+#                      Metrics                      #
+#####################################################
+history_cache = TTLCache(ttl=settings.METRICS_CACHE_SECONDS)
+
+
+def metrics(request):
+    """Prometheus metrics of the web process, with the last sync of
+      each vendor read from the SyncRun history at most once every
+      METRICS_CACHE_SECONDS. Scrapers authenticate with the bearer
+      token in METRICS_TOKEN, without one the endpoint is disabled."""
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    authorization = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(authorization.encode(),
+                               f'Bearer {settings.METRICS_TOKEN}'.encode()):
+        return HttpResponseForbidden()
+
+    history = history_cache.get_or_set('history', lambda: generate_latest(history_registry))
+    return HttpResponse(generate_latest(REGISTRY) + history, content_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
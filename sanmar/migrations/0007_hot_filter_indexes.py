@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:06
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sanmar', '0006_variations_gtin_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(django.db.models.functions.text.Upper('category'), name='snmr_category_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['created_at'], name='snmr_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(django.db.models.functions.text.Upper('category'), name='snmr_products_category_upper'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['created_at', 'product_id'], name='snmr_products_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variations',
+            index=models.Index(fields=['product_number', 'retail_price'], name='snmr_variations_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variations',
+            index=models.Index(fields=['product_number', 'created_at'], name='snmr_variations_created_idx'),
+        ),
+    ]
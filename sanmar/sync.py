@@ -1,243 +1,182 @@
 import os
-from datetime import datetime
-from ftplib import FTP
-import ssl
-import shutil
-from decimal import Decimal
-import logging
 
 from django.conf import settings
-from django.http import HttpResponse
-from django.http import HttpResponseServerError
-
-import pandas as pd
+from django.db import transaction
 
+from catalog.ingest import VendorSync, clean_gtin, clean_integer, clean_numeric
 
 # import product models
-from .models import Category, Products, Variations
-
-
-class Process_snmr_inventory():
+from .models import Category, FeedFile, Products, ProductSummary, Variations
+
+
+#####################################################
+#                   Merge Statements                #
+#####################################################
+# Rows the catalog merge accepts
+CATALOG_ROWS = f"""
+    "PRODUCT_STATUS" IS DISTINCT FROM 'Discontinued'
+    AND "UNIQUE_KEY" IS NOT NULL
+    AND "CATEGORY_NAME" IS NOT NULL
+    AND "THUMBNAIL_IMAGE" IS NOT NULL
+    AND "PRODUCT_TITLE" IS NOT NULL
+    AND "MILL" IS NOT NULL
+    AND "PRODUCT_DESCRIPTION" IS NOT NULL
+    AND "COLOR_NAME" IS NOT NULL
+    AND "COLOR_SQUARE_IMAGE" IS NOT NULL
+    AND "SIZE" IS NOT NULL
+    AND "PIECE_WEIGHT" IS NOT NULL
+    AND "FRONT_MODEL_IMAGE_URL" IS NOT NULL
+    AND {clean_integer('"CASE_SIZE"')} IS NOT NULL
+"""
+
+MERGE_CATEGORIES_SQL = f"""
+    INSERT INTO {{categories}} (category, category_image, product_count,
+                                variation_count, created_at, updated_at)
+    SELECT DISTINCT "CATEGORY_NAME", '', 0, 0, now(), now()
+    FROM {{stage}}
+    WHERE {CATALOG_ROWS}
+    ON CONFLICT (category) DO NOTHING
+"""
+
+MERGE_PRODUCTS_SQL = f"""
+    INSERT INTO {{products}} (product_number, brand_name, short_description,
+                              category_id, full_feature_description,
+                              created_at, updated_at)
+    SELECT DISTINCT ON (split_part("THUMBNAIL_IMAGE", '.', 1))
+           split_part("THUMBNAIL_IMAGE", '.', 1), "MILL", "PRODUCT_TITLE",
+           "CATEGORY_NAME", "PRODUCT_DESCRIPTION", now(), now()
+    FROM {{stage}}
+    WHERE {CATALOG_ROWS}
+    ORDER BY split_part("THUMBNAIL_IMAGE", '.', 1), _line
+    ON CONFLICT (product_number) {{on_conflict}}
+"""
+
+# Catalog, inventory and pricing fields are written together in one pass
+MERGE_VARIATIONS_SQL = f"""
+    INSERT INTO {{variations}} (item_number, product_number_id, color_name,
+                                hex_code, size, case_qty, weight, front_image,
+                                back_image, gtin, quantity, price_per_piece,
+                                price_per_dozen, price_per_case, retail_price,
+                                created_at, updated_at)
+    SELECT s."UNIQUE_KEY", p.product_id, s."COLOR_NAME", s."COLOR_SQUARE_IMAGE",
+           s."SIZE", {clean_integer('s."CASE_SIZE"')}, s."PIECE_WEIGHT",
+           s."FRONT_MODEL_IMAGE_URL",
+           regexp_replace(s."FRONT_MODEL_IMAGE_URL", '[^/]*$', '') || s."BACK_MODEL_IMAGE",
+           {clean_gtin('s."GTIN"')},
+           {clean_integer('s."QTY"')},
+           {clean_numeric('s."PIECE_PRICE"')},
+           {clean_numeric('s."DOZENS_PRICE"')},
+           {clean_numeric('s."CASE_PRICE"')},
+           {clean_numeric('s."MSRP"')},
+           now(), now()
+    FROM {{stage}} s
+    JOIN {{products}} p ON p.product_number = split_part(s."THUMBNAIL_IMAGE", '.', 1)
+    WHERE {CATALOG_ROWS}
+    ON CONFLICT (item_number) {{on_conflict}}
+"""
+
+# Rows left out of the catalog merge (e.g. discontinued styles) still
+# refresh the stock and prices of variations that already exist
+UPDATE_INVENTORY_SQL = f"""
+    UPDATE {{variations}} v
+    SET quantity = s.quantity,
+        price_per_piece = s.price_per_piece,
+        price_per_dozen = s.price_per_dozen,
+        price_per_case = s.price_per_case,
+        retail_price = s.retail_price,
+        updated_at = now()
+    FROM (
+        SELECT "UNIQUE_KEY" AS item_number,
+               {clean_gtin('"GTIN"')} AS gtin,
+               {clean_integer('"QTY"')} AS quantity,
+               {clean_numeric('"PIECE_PRICE"')} AS price_per_piece,
+               {clean_numeric('"DOZENS_PRICE"')} AS price_per_dozen,
+               {clean_numeric('"CASE_PRICE"')} AS price_per_case,
+               {clean_numeric('"MSRP"')} AS retail_price
+        FROM {{stage}}
+        WHERE NOT ({CATALOG_ROWS})
+    ) s
+    WHERE v.item_number = s.item_number
+      AND v.gtin = s.gtin
+      AND (v.quantity, v.price_per_piece, v.price_per_dozen, v.price_per_case, v.retail_price)
+          IS DISTINCT FROM
+          (s.quantity, s.price_per_piece, s.price_per_dozen, s.price_per_case, s.retail_price)
+"""
+
+
+class Process_snmr_inventory(VendorSync):
+    """SanMar adapter: one CSV file holds the catalog, inventory and
+      pricing, merged in a single pass."""
     _skip_existing = False
+    vendor = 'snmr'
 
     # AB connection info
     ftp_host = 'ftp.sanmar.com'
     ftp_user = settings.SANMAR_FTP_USER
     ftp_password = settings.SANMAR_FTP_PASSWORD
+    remote_dir = 'SanMarPDD/'
 
     # AB Product files
-    product_csv = 'SanMar_EPDD.csv'    
-
-    def __init__(self, download=True, debug=True, suffix=None,
-                 basename=None, detail=None):
-        """Initialize inventory by parsing provided inventory
-          CSV file and building a dict of all inventory items."""
-        self._db = None
-        self._download = download
-        self._debug = debug
-        self._suffix = suffix
-        self._basename = basename
-        self._detail = detail
-        self._current_products = {}
-        self._product_images = {}
-        self.logger = logging.getLogger(__name__)
-
-    #####################################################
-    #                       Commons                     #
-    #####################################################
-        
-    def ensure_directory(self, directory):
-        """Ensure that the given directory exists."""
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-
-    def download_file(self, ftp, filename, dir=''):
-        """Download given file from global FTP server."""
-        download_to = os.path.join('files', 'snmr', filename)
-        self.debug("Downloading '{}' to: {}".format(filename, download_to))
-
-        local_file = open(download_to, 'wb')
-        ftp.retrbinary(f'RETR {dir}{filename}', local_file.write)
-        local_file.close()
-
-    def download_snmr(self, filename):
-        """Download the given file."""
-        host = self.ftp_host
-        user = self.ftp_user
-        passwd = self.ftp_password
-
-        ftp = FTP(host=host, timeout=10)
-        ftp.set_debuglevel(2)
-
-        ftp.login(user=user, passwd=passwd)
-
-        self.ensure_directory('files/snmr')  # Ensure 'files' directory exists
-        self.download_file(ftp, filename, dir='SanMarPDD/')
-
-        ftp.quit()
-        
-    def clean_directory(self, directory):
-        """Clean the given directory by removing all files."""
-        self.debug(f"Cleaning directory: {directory}")
-        try:
-            shutil.rmtree(directory)
-            os.makedirs(directory)
-            self.debug(f"Directory cleaned successfully.")
-        except Exception as e:
-            self.debug(f"Error cleaning directory: {e}")
-    
-    def debug(self, msg, force=False):
-        """Method for printing debug messages."""
-        if self._debug or force:
-            print("<{}>: {}".
-                  format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), msg))
-
-            
-    #####################################################
-    #     Download Inventory, products, Price file      #
-    #####################################################
-        
-    def prepare_products(self):
-        """Prepare for updating products by downloading relevant files."""
-        self.download_snmr(self.product_csv)
+    product_csv = 'SanMar_EPDD.csv'
+    feed_files = {product_csv: 'update_catalog'}
+
+    # Models
+    category_model = Category
+    product_model = Products
+    variation_model = Variations
+    summary_model = ProductSummary
+    feed_model = FeedFile
+
+    # Temporary table the product file is copied into
+    stage_table = 'snmr_epdd_stage'
+
+    # Columns of the product file the merge reads
+    feed_columns = ['UNIQUE_KEY', 'PRODUCT_TITLE', 'PRODUCT_DESCRIPTION',
+                    'CATEGORY_NAME', 'COLOR_NAME', 'SIZE', 'PIECE_WEIGHT',
+                    'CASE_SIZE', 'THUMBNAIL_IMAGE', 'COLOR_SQUARE_IMAGE',
+                    'FRONT_MODEL_IMAGE_URL', 'BACK_MODEL_IMAGE', 'MILL',
+                    'PRODUCT_STATUS', 'GTIN', 'QTY', 'PIECE_PRICE',
+                    'DOZENS_PRICE', 'CASE_PRICE', 'MSRP']
+
+    # Fields refreshed on existing rows by the merge
+    product_fields = ['brand_name', 'short_description', 'category_id',
+                      'full_feature_description']
+    variation_fields = ['product_number_id', 'color_name', 'hex_code', 'size',
+                        'case_qty', 'weight', 'front_image', 'back_image', 'gtin']
+    inventory_fields = ['quantity', 'price_per_piece', 'price_per_dozen',
+                        'price_per_case', 'retail_price']
 
     #####################################################
-    #                   Update Products                 #
-    #####################################################
-    def update_products(self, filename):
-        """Read product details from the text file and
-          save them to the model."""
-        file_path = os.path.join('files', 'snmr', filename)
-
-        if not os.path.isfile(file_path):
-            self.debug(f"File {filename} not found.")
-            return
-
-        self.debug(f"Updating products from file: {filename}")
-
-        # Read the file using pandas
-        df = pd.read_csv(file_path, sep=',', encoding='ISO-8859-1', error_bad_lines=False)
-
-        # Iterate over rows and save to the model
-        for _, row in df.iterrows():
-            try:
-                if(row['PRODUCT_STATUS'] != 'Discontinued'):
-                    category, created = Category.objects.get_or_create(category=row['CATEGORY_NAME'])
-
-                    # Create or get Style
-                    product, created = Products.objects.get_or_create(
-                        product_number=row['THUMBNAIL_IMAGE'].split('.')[0],
-                        defaults={
-                            'short_description': row['PRODUCT_TITLE'],
-                            'brand_name': row['MILL'],
-                            'category': category,
-                            'full_feature_description': row['PRODUCT_DESCRIPTION'],
-                        }
-                    )
-
-                    # Create Product
-                    front_img_url = None
-                    back_img_url = None
-                    if not pd.isna(row['FRONT_MODEL_IMAGE_URL']):
-                        front_img_url = row['FRONT_MODEL_IMAGE_URL']
-                        base_url = front_img_url.rsplit('/', 1)[0]
-                        if not pd.isna(row['BACK_MODEL_IMAGE']):
-                            back_img_url = base_url + '/' + row['BACK_MODEL_IMAGE']
-
-                    variation_details = {
-                        'item_number': row['UNIQUE_KEY'],
-                        'product_number': product,
-                        'color_name': row['COLOR_NAME'],
-                        'hex_code': row['COLOR_SQUARE_IMAGE'],
-                        'size': row['SIZE'],
-                        'case_qty': row['CASE_SIZE'],
-                        'weight': row['PIECE_WEIGHT'],
-                        'front_image': front_img_url,
-                        'back_image': back_img_url,
-                        'gtin': str(row['GTIN']),
-                    }
-                    # Use get_or_create for Products
-                    variation, created = Variations.objects.get_or_create(item_number=row['UNIQUE_KEY'], defaults=variation_details)
-
-                    if not created and not self._skip_existing:
-                        Variations.objects.filter(item_number=row['UNIQUE_KEY']).update(**variation_details)
-                        self.debug(f"Updated existing product with Item Number: {row['UNIQUE_KEY']}")
-                    elif not created:
-                        self.debug(f"Skipped existing product with Item Number: {row['UNIQUE_KEY']}")
-                    else:
-                        self.debug(f"Created new product with Item Number: {row['UNIQUE_KEY']}")
-                else:
-                    self.debug(f"Skipped existing product with Item Number: {row['UNIQUE_KEY']} as product is Discontinued.")
-
-            except Exception as e:
-                self.debug(f"Error processing row: {row}")
-                self.debug(f"Error details: {e}")
-
-                
-    #####################################################
-    #                  Update Inventory                 #
-    #####################################################
-    def update_inventory(self, filename):
-        file_path = os.path.join('files', 'snmr', filename)
-
-        if not os.path.isfile(file_path):
-            self.debug(f"File {filename} not found.")
-            return
-
-        self.debug(f"Updating inventory from file: {filename}")
-
-        # Read the file using pandas
-        df = pd.read_csv(file_path, delimiter=',', encoding='ISO-8859-1', error_bad_lines=False)
-
-        for _, row in df.iterrows():
-            # check if the item number and gtin number are not empty. and same
-            item_number = row['UNIQUE_KEY']
-            gtin_number = str(row['GTIN'])
-
-            # Check if the item number is in the product list
-            try:
-                variation = Variations.objects.get(item_number=item_number, gtin=gtin_number)
-            except Variations.DoesNotExist:
-                self.debug(f"Product not found for Item Number: {item_number} and GTIN Number: {gtin_number}")
-                continue  # Skip to the next iteration if the product doesn't exist
-
-            variation.quantity = row['QTY']
-            # update pricing
-            def clean_numeric(value):
-                if pd.isna(value) or value == '“nan”':
-                    return None
-                numeric_value = ''.join(char for char in str(value) if char.isdigit() or char == '.')
-                # Convert the cleaned numeric value to a Decimal
-                return Decimal(numeric_value) if numeric_value else None
-
-            # Update the product details
-            variation.price_per_piece = clean_numeric(row['PIECE_PRICE'])
-            variation.price_per_dozen = clean_numeric(row['DOZENS_PRICE'])
-            variation.price_per_case = clean_numeric(row['CASE_PRICE'])
-            variation.retail_price = clean_numeric(row['MSRP'])
-            variation.save()
-
-            self.debug(f"Updated inventory and Pricing details for Item Number: {item_number} and GTIN Number: {gtin_number}")
-                
-    #####################################################
-    #                   Update Handler                  #
+    #        Update Products, Inventory and Pricing     #
     #####################################################
-    def handle(self):
-        """Handle GET requests to start downloading, processing,
-          and updating the model."""
-        self.clean_directory(os.path.join('files', 'snmr'))
-        self.prepare_products()
-        self.update_products(self.product_csv)
-        self.update_inventory(self.product_csv)
-        self.debug("Finished updating products and inventory and Pricing.")
-        return True
-
-class UpdateSNMRDB():
-    def start(self):
-        try:
-            process_snmr_inventory = Process_snmr_inventory()
-            resp = process_snmr_inventory.handle()
-            return HttpResponse("Data updated successfully.")
-
-        except Exception as e:
-            return HttpResponseServerError(f"Error during update: {str(e)}")
\ No newline at end of file
+    def update_catalog(self, feed):
+        """Load the CSV file once and merge products, inventory and
+          pricing into the category, product and variation tables."""
+        self.logger.info("Updating products, inventory and pricing from file: %s",
+                         os.path.basename(feed.name))
+        self.report(phase='update catalog')
+
+        with transaction.atomic():
+            _, staged = self.load_stage(feed, self.stage_table, self.feed_columns)
+            # Keep only the last line for each item, as the row by row sync did
+            with self.phase('transform'):
+                self.deduplicate_stage(self.stage_table, 'UNIQUE_KEY', keep='last')
+            with self.phase('write'):
+                categories = self.execute_stage_sql(MERGE_CATEGORIES_SQL, self.stage_table)
+                products = self.execute_stage_sql(
+                    MERGE_PRODUCTS_SQL, self.stage_table,
+                    on_conflict=self.conflict_action('products', self.product_fields),
+                )
+                created, updated = self.execute_merge_sql(
+                    MERGE_VARIATIONS_SQL, self.stage_table,
+                    on_conflict=self.conflict_action('variations', self.variation_fields,
+                                                     self.inventory_fields),
+                )
+                inventory = self.execute_stage_sql(UPDATE_INVENTORY_SQL, self.stage_table)
+
+        # Duplicate, discontinued and unchanged rows are skipped
+        self.count(created=created, updated=updated + inventory,
+                   skipped=staged - created - updated - inventory)
+        self.logger.info("Saved %d new categories, %d new or changed products, %d new and "
+                         "%d changed variations, updated inventory of %d other variations.",
+                         categories, products, created, updated, inventory)
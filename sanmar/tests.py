@@ -1,3 +1,389 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.urls import reverse
+
+from api.caching import bump_catalog_version, catalog_version
+from api.testing import CatalogTestCase, FeedSyncMixin, QueryCountMixin, QueryPlanMixin
+from catalog.models import SyncRun, VendorVariation
+from catalog.vendor_views import categories_cache
+from .models import Category, ProductSummary, Variations
+from .sync import Process_snmr_inventory
+
+
+class SanmarTestCase(CatalogTestCase):
+    sync_class = Process_snmr_inventory
+
+
+class QueryPlanTests(QueryPlanMixin, QueryCountMixin, SanmarTestCase):
+    large_tables = ('sanmar_products', 'sanmar_variations')
+
+    def test_endpoints_use_indexes(self):
+        urls = [
+            reverse('snmrproducts:products-list'),
+            reverse('snmrproducts:products-list') + '?category=tees',
+            reverse('snmrproducts:products-list') + '?search=g1',
+            reverse('snmrproducts:products-list') + '?pagination=cursor',
+            reverse('snmrproducts:categories-list'),
+            reverse('snmrproducts:product-variations', args=['G1']),
+            reverse('snmrproducts:products-batch') + '?product_numbers=G0,G2',
+            reverse('snmrproducts:stock') + '?item_numbers=B0S,B1M&gtins=190000000020',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNoSeqScan(url)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.assertConstantQueries(reverse('snmrproducts:products-list'))
+        self.assertConstantQueries(reverse('snmrproducts:products-list') + '?pagination=cursor')
+        # Read once, categories are served from memory, read them every time
+        with mock.patch.object(categories_cache, 'ttl', 0):
+            self.assertConstantQueries(reverse('snmrproducts:categories-list'))
+        self.assertConstantQueries(reverse('snmrproducts:products-batch'), 'product_numbers',
+                                   values=['G0', 'G0,G1,G2'])
+
+
+class ProductSearchTests(SanmarTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = cls.create_category()
+        cls.create_style(category, 0, product_number='G5000', short_description='Heavy Cotton Tee')
+        cls.create_style(category, 1, product_number='G500')
+        cls.create_style(category, 2, product_number='2000', short_description='Ultra Cotton Tee',
+                         full_feature_description='Prints like the G500, ringspun yarn')
+        cls.create_style(category, 3, product_number='64000',
+                         full_feature_description='Softstyle ringspun cotton jersey')
+        cls.refresh_catalog()
+
+    def search(self, terms):
+        response = self.client.get(reverse('snmrproducts:products-list'), {'search': terms})
+        self.assertEqual(response.status_code, 200)
+        return [product['product_number'] for product in response.json()['results']]
+
+    def test_exact_product_number_ranks_first(self):
+        self.assertEqual(self.search('g500'), ['G500', 'G5000', '2000'])
+
+    def test_words_match_descriptions(self):
+        self.assertCountEqual(self.search('ringspun cotton'), ['2000', '64000'])
+
+
+class CatalogCachingTests(SanmarTestCase):
+    catalog_styles = 1
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('snmrproducts:products-list')
+
+    def describe(self, description):
+        self.sync_class.product_model.objects.update(short_description=description)
+
+    def listed_description(self):
+        return self.client.get(self.url).json()['results'][0]['short_description']
+
+    def test_sync_invalidates_cached_pages(self):
+        self.assertEqual(self.listed_description(), 'Tee')
+        self.describe('Heavy Tee')
+        self.assertEqual(self.listed_description(), 'Tee')
+
+        versions = catalog_version('snmr'), catalog_version('catalog')
+        self.sync_class().invalidate_caches()
+
+        self.assertNotEqual(catalog_version('snmr'), versions[0])
+        self.assertNotEqual(catalog_version('catalog'), versions[1])
+        self.assertEqual(self.listed_description(), 'Heavy Tee')
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_new_version_sends_a_new_response(self):
+        response = self.client.get(self.url)
+        self.describe('Heavy Tee')
+        bump_catalog_version('snmr')
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertNotEqual(revalidated.headers['ETag'], response.headers['ETag'])
+        self.assertEqual(revalidated.json()['results'][0]['short_description'], 'Heavy Tee')
+
+
+class BatchProductsTests(SanmarTestCase):
+
+    def batch(self, product_numbers):
+        return self.client.get(reverse('snmrproducts:products-batch'),
+                               {'product_numbers': product_numbers})
+
+    def test_products_keep_the_order_asked_for(self):
+        response = self.batch('G2,G0,G1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['product_number'] for product in response.json()],
+                         ['G2', 'G0', 'G1'])
+        variations = response.json()[0]['variations']
+        self.assertCountEqual([variation['item_number'] for variation in variations],
+                              ['B2S', 'B2M'])
+
+    def test_repeated_and_unknown_products(self):
+        response = self.batch('G1, G9,G1,,G0,G1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['product_number'] for product in response.json()], ['G1', 'G0'])
+
+    def test_too_many_or_no_products_are_rejected(self):
+        too_many = ','.join(f'P{number}' for number in range(101))
+        for product_numbers in (too_many, '', ' , '):
+            with self.subTest(product_numbers=product_numbers[:10]):
+                response = self.batch(product_numbers)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('product_numbers', response.json())
+
+
+class StockTests(SanmarTestCase):
+
+    def stock(self, **params):
+        return self.client.get(reverse('snmrproducts:stock'), params)
+
+    def test_lookup_by_item_number(self):
+        response = self.stock(item_numbers='B2M,B0S,B9S')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'item_number': 'B0S', 'gtin': '190000000000', 'quantity': 10,
+             'price_per_piece': '2.50', 'price_per_dozen': None, 'price_per_case': None,
+             'retail_price': '4.50'},
+            {'item_number': 'B2M', 'gtin': '190000000021', 'quantity': 10,
+             'price_per_piece': '2.50', 'price_per_dozen': None, 'price_per_case': None,
+             'retail_price': '4.50'},
+        ])
+
+    def test_lookup_by_gtin_with_or_without_padding(self):
+        response = self.stock(gtins='00190000000010,190000000011,1.90000000020E+11',
+                              item_numbers='B1S')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([variation['item_number'] for variation in response.json()],
+                         ['B1M', 'B1S', 'B2S'])
+
+    def test_numbers_longer_than_a_gtin_match_nothing(self):
+        response = self.stock(gtins='1' * 29 + ',1.9E+40')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_missing_or_too_many_items_are_rejected(self):
+        too_many = ','.join(f'B{number}' for number in range(300))
+        too_many_gtins = ','.join(str(190000000000 + number) for number in range(201))
+        for params in ({}, {'item_numbers': ' , '},
+                       {'item_numbers': too_many, 'gtins': too_many_gtins}):
+            with self.subTest(params=list(params)):
+                response = self.stock(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('item_numbers', response.json())
+
+
+class ExportTests(SanmarTestCase):
+    catalog_styles = 2
+
+    def export(self, **params):
+        response = self.client.get(reverse('snmrproducts:export'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_has_a_row_per_variation(self):
+        response, content = self.export()
+
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response.headers['X-Accel-Buffering'], 'no')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertCountEqual([row['item_number'] for row in rows], ['B0S', 'B0M', 'B1S', 'B1M'])
+        row = next(row for row in rows if row['item_number'] == 'B1S')
+        self.assertEqual((row['product_number'], row['brand_name'], row['gtin'],
+                          row['quantity'], row['price_per_piece']),
+                         ('G1', 'Gildan', '190000000010', 10, '2.50'))
+
+    def test_csv_has_a_header_and_a_row_per_variation(self):
+        response, content = self.export(output='csv')
+
+        self.assertEqual(response.headers['Content-Type'], 'text/csv')
+        lines = content.decode().splitlines()
+        self.assertTrue(lines[0].startswith(
+            'product_number,brand_name,short_description,category,item_number,'))
+        rows = list(csv.DictReader(lines))
+        self.assertCountEqual([row['item_number'] for row in rows], ['B0S', 'B0M', 'B1S', 'B1M'])
+        row = next(row for row in rows if row['item_number'] == 'B0M')
+        self.assertEqual((row['product_number'], row['gtin'], row['retail_price']),
+                         ('G0', '190000000001', '4.50'))
+
+    def test_gzip_holds_the_same_export(self):
+        for output in ('ndjson', 'csv'):
+            with self.subTest(output=output):
+                response, compressed = self.export(output=output, compress='gzip')
+                _, content = self.export(output=output)
+
+                self.assertEqual(response.headers['Content-Type'], 'application/gzip')
+                self.assertIn(f'.{output}.gz"', response.headers['Content-Disposition'])
+                self.assertEqual(gzip.decompress(compressed), content)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('snmrproducts:export'), {'output': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('output', response.json())
+
+
+class CategoryListTests(SanmarTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('snmrproducts:categories-list')
+
+    def test_warm_list_runs_no_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        category = response.json()['results'][0]
+        self.assertEqual((category['category'], category['product_count'],
+                          category['variation_count']), ('Tees', 3, 6))
+
+        # Another URL misses the page cache, the categories are still in process
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(response.json()['results'][0]['category'], 'Tees')
+
+    def test_sync_refreshes_the_list(self):
+        self.client.get(self.url)
+        self.create_style(self.sync_class.category_model.objects.get(), 3)
+        self.refresh_catalog()
+        self.sync_class().invalidate_caches()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['results'][0]['product_count'], 4)
+
+
+class SanmarSyncTests(FeedSyncMixin, SanmarTestCase):
+    catalog_styles = 0
+    feed_path = Process_snmr_inventory.remote_dir + Process_snmr_inventory.product_csv
+    header = [
+        'UNIQUE_KEY', 'PRODUCT_TITLE', 'PRODUCT_DESCRIPTION', 'STYLE#', 'CATEGORY_NAME',
+        'COLOR_NAME', 'SIZE', 'PIECE_WEIGHT', 'CASE_SIZE', 'THUMBNAIL_IMAGE',
+        'COLOR_SQUARE_IMAGE', 'FRONT_MODEL_IMAGE_URL', 'BACK_MODEL_IMAGE', 'MILL',
+        'PRODUCT_STATUS', 'GTIN', 'QTY', 'PIECE_PRICE', 'DOZENS_PRICE', 'CASE_PRICE', 'MSRP',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.serve_feeds({self.feed_path: self.feed(
+            # Repeated items keep their last line
+            self.row('1', 'PC54', 'S', '00190000000001', qty='1'),
+            self.row('2', 'PC54', 'M', '1.9E+11', qty='4', msrp='5.99'),
+            self.row('3', 'PC61', 'S', '', qty='7', price='3.00', msrp='6.00', category='Polos'),
+            self.row('1', 'PC54', 'S', '00190000000001'),
+            # Short lines miss required values, discontinued styles aren't added
+            '4,Short',
+            self.row('5', 'PC90', 'S', '190000000090', status='Discontinued'),
+            # Too many fields
+            self.row('6', 'PC54', 'L', '190000000002') + ',extra',
+        )})
+
+    def row(self, key, style, size, gtin, qty='5', price='2.50', msrp='4.99',
+            category='T-Shirts', color='Black', status='Active'):
+        return ','.join([
+            key, 'Core Tee', 'Cotton tee', style, category, color, size, '0.4', '72',
+            f'{style}.jpg', f'{style}_{color}.jpg',
+            f'https://cdn.sanmar.com/imglib/{style}_front.jpg', f'{style}_back.jpg',
+            'Port & Company', status, gtin, qty, price, '2.40', '2.30', msrp,
+        ])
+
+    def feed(self, *lines):
+        return '\n'.join([','.join(self.header), *lines, '']).encode()
+
+    def variations(self):
+        return {
+            variation.item_number: (variation.gtin, variation.quantity,
+                                    str(variation.price_per_piece), str(variation.retail_price),
+                                    variation.color_name)
+            for variation in Variations.objects.all()
+        }
+
+    def assertRunCounts(self, **counts):
+        run = SyncRun.objects.filter(vendor='snmr').latest('started_at')
+        self.assertEqual(run.state, SyncRun.FINISHED)
+        self.assertEqual({outcome: getattr(run, f'rows_{outcome}') for outcome in counts},
+                         counts)
+
+    def test_first_load(self):
+        version = catalog_version('snmr')
+        self.sync()
+
+        self.assertRunCounts(created=3, updated=0, skipped=3, errored=1)
+        self.assertEqual(self.variations(), {
+            '1': ('190000000001', 5, '2.50', '4.99', 'Black'),
+            '2': ('190000000000', 4, '2.50', '5.99', 'Black'),
+            '3': ('', 7, '3.00', '6.00', 'Black'),
+        })
+        self.assertEqual(
+            {summary.product.product_number: (str(summary.min_price), str(summary.max_price),
+                                              summary.quantity, summary.variation_count)
+             for summary in ProductSummary.objects.select_related('product')},
+            {'PC54': ('4.99', '5.99', 9, 2), 'PC61': ('6.00', '6.00', 7, 1)},
+        )
+        self.assertEqual(
+            {category.category: (category.product_count, category.variation_count)
+             for category in Category.objects.all()},
+            {'T-Shirts': (1, 2), 'Polos': (1, 1)},
+        )
+        # Variations without a GTIN aren't indexed
+        self.assertCountEqual(
+            VendorVariation.objects.filter(vendor='snmr').values_list('item_number', 'gtin'),
+            [('1', '190000000001'), ('2', '190000000000')],
+        )
+        self.assertNotEqual(catalog_version('snmr'), version)
+
+    def test_reload_of_unchanged_rows_updates_nothing(self):
+        self.sync()
+        variations = self.variations()
+
+        self.sync(force=True)
+
+        self.assertRunCounts(created=0, updated=0)
+        self.assertEqual(self.variations(), variations)
+
+    def test_changed_quantity_and_price(self):
+        self.sync()
+        self.upload(self.feed_path, self.feed(
+            self.row('1', 'PC54', 'S', '00190000000001', qty='9'),
+            # Stock of discontinued styles is still refreshed
+            self.row('2', 'PC54', 'M', '1.9E+11', qty='0', msrp='5.99', status='Discontinued'),
+            self.row('3', 'PC61', 'S', '', qty='7', price='3.50', msrp='7.00', category='Polos'),
+        ))
+
+        self.sync()
+
+        self.assertRunCounts(created=0, updated=3, errored=0)
+        self.assertEqual(self.variations()['1'][1], 9)
+        self.assertEqual(self.variations()['2'][1], 0)
+        self.assertEqual(self.variations()['3'][2:4], ('3.50', '7.00'))
+        self.assertEqual(ProductSummary.objects.get(product__product_number='PC54').quantity, 9)
+        polos = Category.objects.get(category='Polos')
+        self.assertEqual((str(polos.min_price), str(polos.max_price)), ('7.00', '7.00'))
+        self.assertEqual(VendorVariation.objects.get(item_number='1').quantity, 9)
+
+    def test_existing_variations_keep_their_details_when_skipped(self):
+        self.sync()
+        self.upload(self.feed_path, self.feed(
+            self.row('1', 'PC54', 'S', '00190000000001', qty='9', color='White'),
+        ))
+
+        with mock.patch.object(Process_snmr_inventory, '_skip_existing', True):
+            self.sync()
+        self.assertEqual(self.variations()['1'][1:], (9, '2.50', '4.99', 'Black'))
+
+        self.sync(force=True)
+        self.assertEqual(self.variations()['1'][4], 'White')
@@ -1,11 +1,18 @@
 from django.urls import path
-from .views import ProductsListView, CategoryListView, VerboseProductsView, UpdateDataView
+from .views import (
+    ProductsListView, CategoryListView, VerboseProductsView,
+    UpdateDataView, UpdateStatusView, BatchProductsView, StockView, ExportView,
+)
 
 app_name = 'sanmar'
 
 urlpatterns = [
     path('products/', ProductsListView.as_view(), name='products-list'),
+    path('products/batch/', BatchProductsView.as_view(), name='products-batch'),
     path('update-data/', UpdateDataView.as_view(), name='update-data'),
+    path('update-data/<str:job_id>/', UpdateStatusView.as_view(), name='update-status'),
     path('categories/', CategoryListView.as_view(), name='categories-list'),
+    path('stock/', StockView.as_view(), name='stock'),
+    path('export/', ExportView.as_view(), name='export'),
     path('<str:product_number>/', VerboseProductsView.as_view(), name='product-variations'),
 ]
\ No newline at end of file